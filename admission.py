@@ -0,0 +1,161 @@
+"""
+Admission control for the API: per-client rate limiting and a global cap on
+in-flight model calls.
+
+RateLimiter is a token bucket per client (a key listed in API_KEYS, else IP address). A client
+may send `burst` requests at once and `rate` per second after that. Excess
+requests get an immediate 429 with Retry-After, before any work is done.
+
+ConcurrencyLimiter caps the model calls in flight across the process. Calls
+over the cap wait in a bounded FIFO queue for up to `timeout` seconds. When the
+queue is full, or the wait runs out, OverloadedError is raised at once and the
+client gets a 429. Waiters can be threads (Flask) or coroutines (asgi.py);
+both share the same slots. A call under Flask holds a worker thread while it
+runs or waits, a call under asgi.py only a coroutine, so asgi.py switches to
+much larger defaults (use_mode('asyncio')). There the cap mainly protects the
+upstream model and its quota.
+
+Environment:
+    RATE_LIMIT_RPS            requests per second per client (default 5; 0 disables)
+    RATE_LIMIT_BURST          bucket size (default 20)
+    MAX_INFLIGHT_MODEL_CALLS  model calls in flight at once (default 32, 512 under asgi.py; 0 disables)
+    MODEL_QUEUE_SIZE          calls allowed to wait for a slot (default 64, 1024 under asgi.py)
+    MODEL_QUEUE_TIMEOUT_S     longest wait for a slot (default 2)
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class OverloadedError(Exception):
+    """Raised when a model call cannot get a slot; the client should retry later."""
+
+    def __init__(self, message, retry_after=1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    def __init__(self, rate=None, burst=None, max_clients=10000):
+        self.rate = rate if rate is not None else float(os.getenv('RATE_LIMIT_RPS', '5'))
+        self.burst = burst if burst is not None else float(os.getenv('RATE_LIMIT_BURST', '20'))
+        self.max_clients = max_clients
+        self.limited = 0
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, client, cost=1):
+        """Take `cost` tokens from the client's bucket. Returns 0 if the request
+        may proceed, else the seconds until it would be allowed."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - stamp) * self.rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                self.limited += 1
+                wait = (cost - tokens) / self.rate
+            # Most recently seen last; the longest idle clients are dropped first
+            self._buckets[client] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def stats(self):
+        return {'clients': len(self._buckets), 'limited': self.limited}
+
+
+# (MAX_INFLIGHT_MODEL_CALLS, MODEL_QUEUE_SIZE) defaults per serving mode
+DEFAULT_LIMITS = {'threaded': (32, 64), 'asyncio': (512, 1024)}
+
+
+class ConcurrencyLimiter:
+    def __init__(self, limit=None, queue_size=None, timeout=None):
+        default_limit, default_queue = DEFAULT_LIMITS['threaded']
+        self.limit = limit if limit is not None else int(os.getenv('MAX_INFLIGHT_MODEL_CALLS', str(default_limit)))
+        self.queue_size = (queue_size if queue_size is not None
+                           else int(os.getenv('MODEL_QUEUE_SIZE', str(default_queue))))
+        self.timeout = timeout if timeout is not None else float(os.getenv('MODEL_QUEUE_TIMEOUT_S', '2'))
+        self.active = 0
+        self.rejected = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def use_mode(self, mode):
+        """Take the limits from the environment, else the defaults for `mode`
+        ('threaded' or 'asyncio'). Call before serving."""
+        default_limit, default_queue = DEFAULT_LIMITS[mode]
+        self.limit = int(os.getenv('MAX_INFLIGHT_MODEL_CALLS', str(default_limit)))
+        self.queue_size = int(os.getenv('MODEL_QUEUE_SIZE', str(default_queue)))
+
+    def _admit(self, wake):
+        """Take a free slot (True) or join the queue (False). Called with the lock held."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        if len(self._waiters) >= self.queue_size:
+            self.rejected += 1
+            raise OverloadedError(f'{self.active} model calls in flight and {len(self._waiters)} waiting')
+        self._waiters.append(wake)
+        return False
+
+    def _abandon(self, wake):
+        """Leave the queue after a timeout. Returns False if a slot was handed over meanwhile."""
+        with self._lock:
+            if wake in self._waiters:
+                self._waiters.remove(wake)
+                self.rejected += 1
+                return True
+            return False
+
+    def acquire(self):
+        if self.limit <= 0:
+            return
+        event = threading.Event()
+        with self._lock:
+            if self._admit(event.set):
+                return
+        if not event.wait(self.timeout) and self._abandon(event.set):
+            raise OverloadedError(f'no model call slot within {self.timeout:.1f}s')
+
+    async def acquire_async(self):
+        if self.limit <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(True))
+        with self._lock:
+            if self._admit(wake):
+                return
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), self.timeout)
+        except asyncio.TimeoutError:
+            if self._abandon(wake):
+                raise OverloadedError(f'no model call slot within {self.timeout:.1f}s')
+        except asyncio.CancelledError:
+            if not self._abandon(wake):
+                self.release()
+            raise
+
+    def release(self):
+        if self.limit <= 0:
+            return
+        with self._lock:
+            if self._waiters:
+                # Hand the slot straight to the next waiter; `active` stays the same
+                self._waiters.popleft()()
+            else:
+                self.active -= 1
+
+    def stats(self):
+        return {'limit': self.limit, 'active': self.active, 'waiting': len(self._waiters),
+                'rejected': self.rejected}
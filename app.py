@@ -7,26 +7,78 @@ pip install flask google-generativeai python-dotenv
 
 Setup:
 1. Create a .env file with: GEMINI_API_KEY=your_key_here
+   (or TRANSLATOR_BACKEND=openai with OPENAI_API_KEY, or TRANSLATOR_BACKEND=stub to run offline)
 2. Run: python app.py
 3. Open browser to http://localhost:5001
 """
 
-from flask import Flask, render_template, request, jsonify
+import click
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context
+import json
+import math
 import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
-import google.generativeai as genai
+from admission import OverloadedError, RateLimiter
+from applog import get_logger, sample_response, setup_logging
+from backends import get_backend
+from cache import Abandoned, SingleFlight, TTLCache, normalize_text
+from metrics import CACHE_LOOKUPS, PARSE_FAILURES, REGISTRY, REQUEST_LATENCY, REQUESTS
+from resilience import CircuitOpenError
+from semantic_cache import SemanticCache
+from shared_cache import RESPServer, SharedCache, SQLiteStore, open_store
+from phrasebook import load_phrasebook, phrasebook_key, write_phrasebook
+from prefetch import Prefetcher, suggested_responses
+from prompts import PromptTemplate
+from response_parser import SECTION_NAMES, IncrementalParser, ParseError, parse_reply
+from structured_output import TRANSLATION_SCHEMA, parse_structured_translation
+from tracing import end_trace, phase, start_trace, traced_stream
+from usage import USAGE_DIR, parse_prices, rollup_path, summarize
+from warmup import read_logs, read_requests, warm
+from template_cache import build_templates as compile_templates, use_compiled_templates
 
 load_dotenv()
+setup_logging()
+log = get_logger('app')
 
 app = Flask(__name__)
 
-# Configure Gemini
-genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-if not os.getenv("GEMINI_API_KEY"):
-    print("⚠️ Gemini API key not found. Please set GEMINI_API_KEY in .env file")
-model = genai.GenerativeModel("gemini-flash-latest")
+PHRASEBOOK_PATH = os.getenv('PHRASEBOOK_PATH', 'phrasebook.json')
+TEMPLATE_CACHE_DIR = os.getenv('TEMPLATE_CACHE_DIR', os.path.join(app.root_path, '.jinja_compiled'))
 
-# Language configurations
+# Templates are static files; use the precompiled versions when they are up to date
+use_compiled_templates(app, TEMPLATE_CACHE_DIR)
+
+# Model backend (TRANSLATOR_BACKEND: gemini, openai or stub)
+backend = get_backend()
+
+# 'sections' (TRANSLATION/CONTEXT/RESPONSES text) or 'json' (schema-validated JSON object)
+TRANSLATE_OUTPUT_MODE = os.getenv('TRANSLATE_OUTPUT_MODE', 'sections')
+
+# Cache of parsed /api/translate results, keyed on (normalized text, language, direction)
+translation_cache = TTLCache(
+    maxsize=int(os.getenv('TRANSLATION_CACHE_SIZE', '1024')),
+    ttl=int(os.getenv('TRANSLATION_CACHE_TTL', '86400'))
+)
+# Concurrent identical translations (same cache key) share one model call
+translation_flights = SingleFlight()
+
+# Second tier for near-duplicate phrasings ("I have fever" / "i have a fever"), per language and direction
+semantic_translations = SemanticCache('semantic_translation', ttl=translation_cache.ttl)
+semantic_advice = SemanticCache('semantic_advice', ttl=translation_cache.ttl)
+# Third tier shared by all workers and kept across restarts (SHARED_CACHE_URL: sqlite:// or redis://)
+shared_cache = SharedCache(open_store(os.getenv('SHARED_CACHE_URL', '')), ttl=translation_cache.ttl)
+
+# Per-client token buckets for the API (RATE_LIMIT_RPS, RATE_LIMIT_BURST)
+rate_limiter = RateLimiter()
+
+# Language configurations. output_limits caps each reply per endpoint: max_output_tokens and
+# stop_sequences are passed to the model as generation config (batch calls get the translate
+# budget per phrase). Urdu and Twi take more tokens per word than Chinese.
 LANGUAGE_CONFIG = {
     'chinese': {
         'name': '中文',
@@ -49,7 +101,11 @@ LANGUAGE_CONFIG = {
         ],
         'direction_hospital_to_patient_label': '医院（英文）→ 患者（中文）',
         'direction_patient_to_hospital_label': '患者（中文）→ 医院（英文）',
-        'speaker': 'Chinese-speaking'
+        'speaker': 'Chinese-speaking',
+        'output_limits': {
+            'translate': {'max_output_tokens': 400},
+            'advice': {'max_output_tokens': 800}
+        }
     },
     'urdu': {
         'name': 'اردو',
@@ -72,7 +128,11 @@ LANGUAGE_CONFIG = {
         ],
         'direction_hospital_to_patient_label': 'ہسپتال (انگریزی) → مریض (اردو)',
         'direction_patient_to_hospital_label': 'مریض (اردو) → ہسپتال (انگریزی)',
-        'speaker': 'Urdu-speaking'
+        'speaker': 'Urdu-speaking',
+        'output_limits': {
+            'translate': {'max_output_tokens': 600},
+            'advice': {'max_output_tokens': 1000}
+        }
     },
     'twi': {
         'name': 'Twi',
@@ -95,10 +155,193 @@ LANGUAGE_CONFIG = {
         ],
         'direction_hospital_to_patient_label': 'Ayaresabea (English) → Twi',
         'direction_patient_to_hospital_label': 'Twi → Ayaresabea (English)',
-        'speaker': 'Twi-speaking'
+        'speaker': 'Twi-speaking',
+        'output_limits': {
+            'translate': {'max_output_tokens': 600},
+            'advice': {'max_output_tokens': 1100}
+        }
     }
 }
 
+# Hospital-side quick questions (English), shown on the realtime page
+HOSPITAL_QUICK_QUESTIONS = [
+    'Do you have insurance?',
+    'What brings you in today?',
+    'Any allergies?',
+    'When did the symptoms start?'
+]
+
+# Precomputed quick-question translations, served without a model call
+phrasebook = load_phrasebook(PHRASEBOOK_PATH)
+for (text, lang, direction), entry in phrasebook.items():
+    semantic_translations.set(text, (lang, direction), entry, ttl=0)
+
+
+def lookup_cached(cache_key):
+    """Phrasebook entry or cached result for `cache_key`, or None. Counted in metrics."""
+    result = lookup_tiers(cache_key)
+    if cache_key[2] == 'patient_to_hospital':
+        prefetcher.observe(cache_key, result is not None)
+    return result
+
+
+def lookup_tiers(cache_key):
+    result = phrasebook.get(cache_key)
+    if result is not None:
+        CACHE_LOOKUPS.inc('phrasebook', 'hit')
+        return result
+    CACHE_LOOKUPS.inc('phrasebook', 'miss')
+    result = translation_cache.get(cache_key)
+    CACHE_LOOKUPS.inc('translation', 'miss' if result is None else 'hit')
+    if result is not None:
+        return result
+    text, lang, direction = cache_key
+    # Only known scopes are ever written below (see cache_translation)
+    if lang not in LANGUAGE_CONFIG or direction not in DIRECTIONS:
+        return None
+    result = shared_cache.get(('translation', lang, direction, text))
+    if result is not None:
+        translation_cache.set(cache_key, result)
+        return result
+    return semantic_translations.get(text, (lang, direction))
+
+
+def cache_translation(cache_key, result):
+    translation_cache.set(cache_key, result)
+    text, lang, direction = cache_key
+    # Only known scopes get a semantic index or shared entries, so clients cannot create unbounded ones
+    if lang in LANGUAGE_CONFIG and direction in DIRECTIONS:
+        semantic_translations.set(text, (lang, direction), result)
+        shared_cache.set(('translation', lang, direction, text), result)
+        prefetcher.after_translation(cache_key, result)
+
+
+def lookup_advice(symptom, lang):
+    """Cached advice for `symptom`, from the shared cache or a near-duplicate, or None."""
+    if lang not in LANGUAGE_CONFIG:
+        return None
+    result = shared_cache.get(('advice', lang, normalize_text(symptom)))
+    if result is None:
+        result = semantic_advice.get(symptom, (lang,))
+    return result
+
+
+def cache_advice(symptom, lang, result):
+    if lang in LANGUAGE_CONFIG:
+        semantic_advice.set(symptom, (lang,), result)
+        shared_cache.set(('advice', lang, normalize_text(symptom)), result)
+
+
+def model_error(e, message, **fields):
+    """Log a failed model call and build its JSON error response: 429 when no
+    model call slot was free, 503 while the circuit breaker is open (both with
+    Retry-After), 504 on timeout, else 500."""
+    response = jsonify({'error': f'{type(e).__name__}: {str(e)}'})
+    if isinstance(e, (OverloadedError, CircuitOpenError)):
+        log.warning(message, extra={'fields': {**fields, 'error': str(e)}})
+        response.status_code = 429 if isinstance(e, OverloadedError) else 503
+        response.headers['Retry-After'] = str(math.ceil(e.retry_after))
+    else:
+        log.exception(message, extra={'fields': fields})
+        response.status_code = 504 if isinstance(e, TimeoutError) else 500
+    return response
+
+
+def metric_labels(endpoint, data):
+    """(endpoint, language, direction) labels for a request, limited to known values."""
+    data = data if isinstance(data, dict) else {}
+    lang = data.get('language', 'chinese')
+    # A fan-out request covers every language at once
+    lang = 'all' if endpoint == 'translate_all' else lang if lang in LANGUAGE_CONFIG else 'other'
+    if 'advice' in endpoint:
+        return endpoint, lang, ''
+    direction = data.get('direction', 'hospital_to_patient')
+    return endpoint, lang, direction if direction in ('hospital_to_patient', 'patient_to_hospital') else 'other'
+
+
+def observe_request(endpoint, data, status, start):
+    labels = metric_labels(endpoint, data)
+    REQUESTS.inc(*labels, str(status))
+    REQUEST_LATENCY.observe(time.perf_counter() - start, *labels)
+
+
+# Request count, latency and phase timing (Server-Timing, trace spans) for the API endpoints
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+    if request.path.startswith('/api/') and request.method == 'POST':
+        g.trace = start_trace(f'{request.method} {request.path}', request.headers.get('traceparent'),
+                              **{'http.route': request.path})
+
+
+# Known kiosk keys (comma-separated); any other X-API-Key is ignored
+API_KEYS = frozenset(filter(None, (key.strip() for key in os.getenv('API_KEYS', '').split(','))))
+
+
+def client_id(api_key, address):
+    # Kiosks with a known API key are limited per key, everyone else per IP address. Unknown keys are
+    # ignored, so rotating made-up keys neither escapes the limit nor pushes other clients' buckets out.
+    return f'key:{api_key}' if api_key in API_KEYS else f'ip:{address}'
+
+
+@app.before_request
+def limit_rate():
+    if request.path.startswith('/api/') and request.method == 'POST':
+        wait = rate_limiter.allow(client_id(request.headers.get('X-API-Key'), request.remote_addr))
+        if wait:
+            response = jsonify({'error': 'Too many requests'})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(math.ceil(wait))
+            return response
+
+
+@app.after_request
+def record_request(response):
+    if request.path.startswith('/api/') and request.method == 'POST' and 'request_start' in g:
+        observe_request(request.endpoint or 'unknown', request.get_json(silent=True), response.status_code,
+                        g.request_start)
+    if 'trace' in g:
+        g.trace.root.attributes['http.status_code'] = response.status_code
+        response.headers['Server-Timing'] = g.trace.server_timing()
+    return response
+
+
+@app.teardown_request
+def finish_trace(error=None):
+    # Streamed responses end their trace when the stream finishes (see sse_response)
+    if 'trace' in g and not g.get('trace_streamed'):
+        end_trace(g.trace)
+
+
+@REGISTRY.register_collector
+def state_metrics():
+    flights = translation_flights.stats()
+    breaker = backend.breaker.stats()
+    limiter = backend.limiter.stats()
+    return [
+        ('mendy_cache_entries', 'gauge', 'Entries in the translation cache.', [({}, len(translation_cache))]),
+        ('mendy_phrasebook_entries', 'gauge', 'Entries in the offline phrasebook.', [({}, len(phrasebook))]),
+        ('mendy_semantic_cache_entries', 'gauge', 'Entries in the semantic caches.',
+         [({'cache': cache.name}, len(cache)) for cache in (semantic_translations, semantic_advice)]),
+        ('mendy_single_flight_calls_total', 'counter', 'Model calls made on translation cache misses.',
+         [({}, flights['calls'])]),
+        ('mendy_single_flight_shared_total', 'counter',
+         'Translation requests that shared an in-flight model call.', [({}, flights['shared'])]),
+        ('mendy_circuit_breaker_open', 'gauge', 'Whether the model circuit breaker is open (1) or closed (0).',
+         [({'backend': backend.name}, int(breaker['state'] != 'closed'))]),
+        ('mendy_circuit_breaker_rejected_total', 'counter',
+         'Model calls rejected without calling the model while the breaker was open.',
+         [({'backend': backend.name}, breaker['rejected'])]),
+        ('mendy_model_calls_inflight', 'gauge', 'Model calls holding a concurrency slot.', [({}, limiter['active'])]),
+        ('mendy_model_calls_waiting', 'gauge', 'Model calls queued for a concurrency slot.',
+         [({}, limiter['waiting'])]),
+        ('mendy_model_calls_overloaded_total', 'counter',
+         'Model calls rejected because the slot queue was full or the wait timed out.', [({}, limiter['rejected'])]),
+        ('mendy_rate_limited_total', 'counter', 'API requests rejected by the per-client rate limit.',
+         [({}, rate_limiter.stats()['limited'])]),
+    ]
+
+
 # Route for home page
 @app.route('/')
 def home():
@@ -109,7 +352,8 @@ def home():
 def realtime():
     lang = request.args.get('lang', 'chinese')
     config = LANGUAGE_CONFIG.get(lang, LANGUAGE_CONFIG['chinese'])
-    return render_template('realtime.html', language=lang, config=config)
+    return render_template('realtime.html', language=lang, config=config,
+                           hospital_quick_questions=HOSPITAL_QUICK_QUESTIONS)
 
 # Route for hospital preparation page
 @app.route('/preparation')
@@ -118,10 +362,158 @@ def preparation():
     config = LANGUAGE_CONFIG.get(lang, LANGUAGE_CONFIG['chinese'])
     return render_template('preparation.html', language=lang, config=config)
 
+def translate_instructions(config, direction):
+    """Wording shared by the single-phrase, batch and JSON translate prompts."""
+    target = config['target_lang']
+    if direction == 'hospital_to_patient':
+        return {
+            'intro': f"You are a medical translator helping {config['speaker']} patients at an English-speaking hospital.",
+            'task': f"Translate this English medical phrase to {target} and provide helpful context",
+            'batch_task': f"Translate each English medical phrase below to {target} and provide helpful context",
+            'translation': f"[Direct word-to-word {target} translation]",
+            'context': f"[In {target}: Explain the situation, where they likely are, and what the staff is asking for]",
+            'responses': f"[In {target}: Provide 2-3 possible responses they can give, with English translations]",
+            'limits': "Show No pronunciation. Keep it practical and concise, within 50 words for context and responses."
+        }
+    # patient_to_hospital: translate from patient's language -> English and give context in patient's language
+    return {
+        'intro': f"You are a medical translator helping {config['speaker']} patients communicate in an English-speaking hospital.",
+        'task': f"Translate this {target} phrase to English and provide helpful context in {target}",
+        'batch_task': f"Translate each {target} phrase below to English and provide helpful context in {target}",
+        'translation': "[Direct English translation]",
+        'context': f"[In {target}: Explain the situation and how their answer might affect their experience in hospital]",
+        'responses': (f"[In Both English and {target}: Provide 2-3 suggestions they might also say "
+                      "to the hospital staff related to what they said]"),
+        'limits': "Show no pronunciation. Keep it concise, within 50 words for context."
+    }
+
+
+def build_translate_prompt(text, config, direction, output_mode='sections'):
+    parts = translate_instructions(config, direction)
+    if output_mode == 'json':
+        answer = f"""Reply with only a JSON object with these string fields:
+"translation": {parts['translation']}
+"context": {parts['context']}
+"responses": {parts['responses']}"""
+    else:
+        answer = f"""Provide your response in this exact format:
+
+TRANSLATION:
+{parts['translation']}
+
+CONTEXT:
+{parts['context']}
+
+RESPONSES:
+{parts['responses']}"""
+    # The phrase goes last so everything before it is the same for every call (see prompts.py)
+    return f"""{parts['intro']}
+
+{parts['task']}. The phrase is at the end of this message.
+
+{answer}
+
+{parts['limits']}
+
+Phrase:
+"{text}\""""
+
+
+def parse_translation(content):
+    # Raises ParseError when a section header is missing
+    return parse_reply(content)
+
+
+def handle_translation_reply(content, lang, output_mode='sections'):
+    """Parse a model reply. Returns (result, parsed) where parsed is False if
+    the reply had to be returned raw."""
+    if sample_response():
+        log.info('model reply', extra={'fields': {'backend': backend.name, 'language': lang, 'reply': content}})
+    
+    with phase('parse', format=output_mode):
+        try:
+            if output_mode == 'json':
+                result, repaired = parse_structured_translation(content, fallback_parser=parse_translation)
+                if repaired:
+                    log.info('structured reply repaired', extra={'fields': {'language': lang}})
+                return result, True
+            return parse_translation(content), True
+        except ValueError as parse_error:
+            PARSE_FAILURES.inc(output_mode, lang)
+            log.warning('reply parse failed', extra={'fields': {
+                'language': lang, 'error': str(parse_error), 'reply': content}})
+            return {
+                'translation': content,
+                'context': 'Raw response (parsing failed)',
+                'responses': 'See translation above'
+            }, False
+
+
+def translate_text(text, lang, direction):
+    """Translate one phrase with the model. Returns (result, parsed)."""
+    with phase('prompt'):
+        prompt = prompt_template(lang, direction, TRANSLATE_OUTPUT_MODE).render(text)
+    schema = TRANSLATION_SCHEMA if TRANSLATE_OUTPUT_MODE == 'json' else None
+    
+    log.debug('model call', extra={'fields': {'language': lang, 'direction': direction}})
+    content = backend.generate(prompt, json_schema=schema, limits=output_limits(lang, 'translate'))
+    return handle_translation_reply(content, lang, TRANSLATE_OUTPUT_MODE)
+
+
+async def translate_text_async(text, lang, direction):
+    """translate_text() for the asyncio serving path in asgi.py."""
+    with phase('prompt'):
+        prompt = prompt_template(lang, direction, TRANSLATE_OUTPUT_MODE).render(text)
+    schema = TRANSLATION_SCHEMA if TRANSLATE_OUTPUT_MODE == 'json' else None
+    
+    log.debug('model call', extra={'fields': {'language': lang, 'direction': direction}})
+    content = await backend.generate_async(prompt, json_schema=schema, limits=output_limits(lang, 'translate'))
+    return handle_translation_reply(content, lang, TRANSLATE_OUTPUT_MODE)
+
+
+def fetch_translation(text, lang, direction, cache_key):
+    """Translate on a cache miss. Concurrent callers with the same key share
+    one model call; parsed results are cached."""
+    def call():
+        result, parsed = translate_text(text, lang, direction)
+        if parsed:
+            cache_translation(cache_key, result)
+        return result
+    return translation_flights.do(cache_key, call)
+
+
+def stale_translation(cache_key, error):
+    """The expired cache entry for `cache_key`, or None. An expired entry is
+    better than an error while the model is down."""
+    result = translation_cache.get_stale(cache_key)
+    if result is not None:
+        log.warning('serving stale translation', extra={'fields': {
+            'language': cache_key[1], 'error': f'{type(error).__name__}: {error}'}})
+    return result
+
+
+def fetch_or_stale(text, lang, direction, cache_key):
+    """fetch_translation, falling back to an expired cache entry if it fails."""
+    try:
+        return fetch_translation(text, lang, direction, cache_key)
+    except Exception as e:
+        result = stale_translation(cache_key, e)
+        if result is None:
+            raise
+        return result
+
+
+# Translates the patient's likely replies in the background (PREFETCH_RESPONSES=1, see prefetch.py)
+prefetcher = Prefetcher(fetch_translation,
+                        lambda key: key in phrasebook or translation_cache.get_stale(key) is not None,
+                        getattr(backend, 'limiter', None))
+
+
 # Translation API endpoint
 @app.route('/api/translate', methods=['POST'])
 def translate():
-    data = request.json
+    with phase('decode'):
+        data = request.json
     text = data.get('text', '')
     lang = data.get('language', 'chinese')
     # direction: 'hospital_to_patient' (English -> target) or 'patient_to_hospital' (target -> English)
@@ -130,793 +522,573 @@ def translate():
     if not text:
         return jsonify({'error': 'No text provided'}), 400
     
-    config = LANGUAGE_CONFIG.get(lang, LANGUAGE_CONFIG['chinese'])
+    cache_key = phrasebook_key(text, lang, direction)
+    with phase('cache'):
+        result = lookup_cached(cache_key)
+    log.info('translate', extra={'fields': {
+        'language': lang, 'direction': direction, 'text': text, 'cached': result is not None}})
     
-    if direction == 'hospital_to_patient':
-        prompt = f"""You are a medical translator helping {config['speaker']} patients at an English-speaking hospital.
+    if result is None:
+        try:
+            result = fetch_or_stale(text, lang, direction, cache_key)
+        except Exception as e:
+            return model_error(e, 'translate failed', language=lang)
+    
+    with phase('jsonify'):
+        return jsonify(result)
 
-Translate this English medical phrase to {config['target_lang']} and provide helpful context:
-"{text}"
 
-Provide your response in this exact format:
+BATCH_MAX_TEXTS = int(os.getenv('BATCH_MAX_TEXTS', '100'))
+BATCH_ITEMS_PER_PROMPT = int(os.getenv('BATCH_ITEMS_PER_PROMPT', '10'))
+BATCH_CHARS_PER_PROMPT = int(os.getenv('BATCH_CHARS_PER_PROMPT', '4000'))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '4'))
 
-TRANSLATION:
-[Direct word-to-word {config['target_lang']} translation]
+# Marker line the model writes before each item of a batch reply, e.g. "=== ITEM 3 ==="
+BATCH_ITEM_MARKER = re.compile(r'^[ \t*#]*=+\s*ITEM\s+(\d+)\s*=+[ \t*]*$', re.MULTILINE)
 
-CONTEXT:
-[In {config['target_lang']}: Explain the situation, where they likely are, and what the staff is asking for]
 
-RESPONSES:
-[In {config['target_lang']}: Provide 2-3 possible responses they can give, with English translations]
+def batch_items(texts):
+    # Phrases are JSON-encoded so quotes, newlines or marker-like text in user input cannot break the format
+    items = '\n'.join(f"{i}. {json.dumps(text, ensure_ascii=False)}" for i, text in enumerate(texts, 1))
+    return f"The phrases are numbered 1 to {len(texts)}:\n{items}"
 
 
-Show No pronunciation. Keep it practical and concise, within 50 words for context and responses."""
-    else:
-        # patient_to_hospital: translate from patient's language -> English and give context in patient's language
-        prompt = f"""You are a medical translator helping {config['speaker']} patients communicate in an English-speaking hospital.
+def build_batch_translate_prompt(items, config, direction):
+    """Batch prompt around `items`, the numbered phrase list from batch_items()."""
+    parts = translate_instructions(config, direction)
+    return f"""{parts['intro']}
 
-Translate this {config['target_lang']} phrase to English and provide helpful context in {config['target_lang']}:
-"{text}"
+{parts['batch_task']}. The phrases are at the end of this message.
 
-Provide your response in this exact format:
+For every phrase, in order, reply with a block in this exact format:
 
+=== ITEM <number> ===
 TRANSLATION:
-[Direct English translation]
+{parts['translation']}
 
 CONTEXT:
-[In {config['target_lang']}: Explain the situation and how their answer might affect their experience in hospital]
+{parts['context']}
 
 RESPONSES:
-[In Both English and {config['target_lang']}: Provide 2-3 suggestions they might also say to the hospital staff related to what they said]
+{parts['responses']}
 
-Show no pronunciation. Keep it concise, within 50 words for context."""
+{parts['limits']} These limits apply to each phrase.
 
-    try:
-        print(f"Translating to {lang}: {text}")
-        response = model.generate_content(prompt)
-        content = response.text
-        
-        print("=" * 50)
-        print(f"GEMINI RESPONSE ({lang}):")
-        print(content)
-        print("=" * 50)
-        
-        # Parse the response
+{items}"""
+
+
+def parse_batch_translation(content, count):
+    """Split a batch reply into {item number: parsed result}. Items that are
+    missing or fail to parse are left out."""
+    # Only markers in sequence count, so a marker echoed inside a translation does not split it
+    markers = []
+    for marker in BATCH_ITEM_MARKER.finditer(content):
+        if int(marker.group(1)) == len(markers) + 1 and len(markers) < count:
+            markers.append(marker)
+    
+    results = {}
+    for i, marker in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(content)
         try:
-            parts = content.split('TRANSLATION:')[1].split('CONTEXT:')
-            translation = parts[0].strip()
-            
-            parts2 = parts[1].split('RESPONSES:')
-            context = parts2[0].strip()
-            responses = parts2[1].strip()
-        except (IndexError, AttributeError) as parse_error:
-            print(f"Parsing error: {parse_error}")
-            return jsonify({
-                'translation': content,
-                'context': 'Raw response (parsing failed)',
-                'responses': 'See translation above'
-            })
-        
-        return jsonify({
-            'translation': translation,
-            'context': context,
-            'responses': responses
-        })
-    except Exception as e:
-        print(f"ERROR: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({'error': f'{type(e).__name__}: {str(e)}'}), 500
+            results[i + 1] = parse_translation(content[marker.end():end])
+        except ParseError:
+            log.warning('batch item parse failed', extra={'fields': {'item': i + 1}})
+    return results
 
-# Hospital preparation advice API endpoint
-@app.route('/api/advice', methods=['POST'])
-def advice():
+
+def translate_batch_chunk(texts, lang, direction):
+    """Translate a chunk of phrases with one model call. Returns {index: result}
+    for the phrases whose part of the reply parsed."""
+    prompt = prompt_template(lang, direction, 'batch').render(batch_items(texts))
+    log.debug('batch model call', extra={'fields': {'language': lang, 'direction': direction, 'items': len(texts)}})
+    content = backend.generate(prompt, limits=output_limits(lang, 'translate', items=len(texts)))
+    parsed = parse_batch_translation(content, len(texts))
+    if len(parsed) < len(texts):
+        PARSE_FAILURES.inc('batch', lang, amount=len(texts) - len(parsed))
+    return {number - 1: result for number, result in parsed.items()}
+
+
+def chunk_batch(texts):
+    chunk, size = [], 0
+    for text in texts:
+        if chunk and (len(chunk) >= BATCH_ITEMS_PER_PROMPT or size + len(text) > BATCH_CHARS_PER_PROMPT):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(text)
+        size += len(text)
+    if chunk:
+        yield chunk
+
+
+# Batch translation endpoint: packs many phrases into as few model calls as possible
+@app.route('/api/translate/batch', methods=['POST'])
+def translate_batch():
     data = request.json
-    symptom = data.get('symptom', '')
+    texts = data.get('texts', [])
     lang = data.get('language', 'chinese')
+    direction = data.get('direction', 'hospital_to_patient')
     
-    if not symptom:
-        return jsonify({'error': 'No symptom provided'}), 400
+    if not isinstance(texts, list) or not texts or not all(isinstance(t, str) and t for t in texts):
+        return jsonify({'error': 'texts must be a non-empty list of phrases'}), 400
+    if len(texts) > BATCH_MAX_TEXTS:
+        return jsonify({'error': f'At most {BATCH_MAX_TEXTS} texts per batch'}), 400
     
-    config = LANGUAGE_CONFIG.get(lang, LANGUAGE_CONFIG['chinese'])
+    # Serve what we can from the phrasebook and cache; each distinct missing phrase is translated once
+    keys = [phrasebook_key(text, lang, direction) for text in texts]
+    results = {}
+    missing = {}
+    for text, key in zip(texts, keys):
+        cached = lookup_cached(key)
+        if cached is not None:
+            results[key] = cached
+        elif key not in missing:
+            missing[key] = text
     
-    prompt = f"""You are a medical advisor helping a {config['speaker']} person understand what United States hospital care they need.
+    try:
+        missing_keys = list(missing)
+        with ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY) as pool:
+            chunks = list(chunk_batch(list(missing.values())))
+            offsets = [sum(len(c) for c in chunks[:i]) for i in range(len(chunks))]
+            for offset, parsed in zip(offsets, pool.map(lambda c: translate_batch_chunk(c, lang, direction), chunks)):
+                for index, result in parsed.items():
+                    key = missing_keys[offset + index]
+                    cache_translation(key, result)
+                    results[key] = result
+            
+            # Anything the batch reply did not cover falls back to a regular per-item call
+            failed = [key for key in missing_keys if key not in results]
+            if failed:
+                log.warning('batch fallback', extra={'fields': {
+                    'language': lang, 'failed': len(failed), 'missing': len(missing_keys)}})
+            for key, result in zip(failed, pool.map(
+                    lambda k: fetch_translation(missing[k], lang, direction, k), failed)):
+                results[key] = result
+    except Exception as e:
+        for key in missing:
+            if key not in results:
+                stale = stale_translation(key, e)
+                if stale is not None:
+                    results[key] = stale
+        if any(key not in results for key in keys):
+            return model_error(e, 'batch translate failed', language=lang)
+    
+    return jsonify({'results': [results[key] for key in keys]})
+
 
-The patient says: "{symptom}"
+def build_advice_prompt(symptom, config):
+    return f"""You are a medical advisor helping a {config['speaker']} person understand what United States hospital care they need.
 
-Provide advice in {config['target_lang']} about:
+For what the patient says at the end of this message, provide advice in {config['target_lang']} about:
 1. What type of doctor/department they should see
 2. Whether they need an appointment
 3. What to expect during the visit
 4. What to bring (insurance, ID, etc.)
 5. Any costs they might incur
 
-Keep it practical and concise, within 200 words. Use {config['target_lang']}, No pronunciation."""
+Keep it practical and concise, within 200 words. Use {config['target_lang']}, No pronunciation.
+
+The patient says: "{symptom}\""""
+
+
+DIRECTIONS = ('hospital_to_patient', 'patient_to_hospital')
+
+
+def compile_prompts(language_config):
+    """Precompile every prompt: {(language, direction, kind): PromptTemplate}.
+    Kinds are 'sections' and 'json' (/api/translate), 'batch' and 'advice'."""
+    templates = {}
+    for lang, config in language_config.items():
+        for direction in DIRECTIONS:
+            # Usage labels match the request metrics; the streaming endpoints share these prompts
+            labels = {'endpoint': 'translate', 'language': lang, 'direction': direction}
+            for mode in ('sections', 'json'):
+                templates[lang, direction, mode] = PromptTemplate.compile(
+                    f'translate:{lang}:{direction}:{mode}', build_translate_prompt, config, direction, mode,
+                    labels=labels)
+            templates[lang, direction, 'batch'] = PromptTemplate.compile(
+                f'batch:{lang}:{direction}', build_batch_translate_prompt, config, direction,
+                labels={**labels, 'endpoint': 'translate_batch'})
+        templates[lang, None, 'advice'] = PromptTemplate.compile(
+            f'advice:{lang}', build_advice_prompt, config,
+            labels={'endpoint': 'advice', 'language': lang, 'direction': ''})
+    return templates
+
+
+PROMPTS = compile_prompts(LANGUAGE_CONFIG)
+
+
+# Multiplies every max_output_tokens budget, to leave room for a thinking model's reasoning tokens.
+# Defaults to the backend's own scale (8 for Gemini, whose default model thinks; 1 otherwise).
+MAX_OUTPUT_TOKENS_SCALE = float(os.getenv('MAX_OUTPUT_TOKENS_SCALE') or backend.output_scale)
+
+
+def output_limits(lang, endpoint, items=None):
+    """Generation limits for a 'translate' or 'advice' model call, from the
+    language's output_limits. A batch call of `items` phrases gets the translate
+    budget for each, and stops before a phrase number that was not asked for."""
+    limits = LANGUAGE_CONFIG.get(lang, LANGUAGE_CONFIG['chinese'])['output_limits'][endpoint]
+    stop_sequences = list(limits.get('stop_sequences', ()))
+    if items:
+        stop_sequences.append(f'=== ITEM {items + 1} ===')
+    return {
+        'max_output_tokens': math.ceil(limits['max_output_tokens'] * (items or 1) * MAX_OUTPUT_TOKENS_SCALE),
+        'stop_sequences': stop_sequences
+    }
+
+
+def prompt_template(lang, direction, kind):
+    # Unknown languages fall back to Chinese and unknown directions to patient_to_hospital, as the builders do
+    lang = lang if lang in LANGUAGE_CONFIG else 'chinese'
+    if kind == 'advice':
+        direction = None
+    elif direction != 'hospital_to_patient':
+        direction = 'patient_to_hospital'
+    return PROMPTS[lang, direction, kind]
+
+
+# Hospital preparation advice API endpoint
+@app.route('/api/advice', methods=['POST'])
+def advice():
+    data = request.json
+    symptom = data.get('symptom', '')
+    lang = data.get('language', 'chinese')
+    
+    if not symptom:
+        return jsonify({'error': 'No symptom provided'}), 400
+    
+    with phase('cache'):
+        cached = lookup_advice(symptom, lang)
+    log.info('advice', extra={'fields': {'language': lang, 'text': symptom, 'cached': cached is not None}})
+    if cached is not None:
+        return jsonify({'advice': cached})
+
+    with phase('prompt'):
+        prompt = prompt_template(lang, None, 'advice').render(symptom)
 
     try:
-        print(f"Getting advice in {lang}: {symptom}")
-        response = model.generate_content(prompt)
-        
-        return jsonify({
-            'advice': response.text
-        })
+        result = backend.generate(prompt, limits=output_limits(lang, 'advice'))
     except Exception as e:
-        print(f"ERROR: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({'error': f'{type(e).__name__}: {str(e)}'}), 500
+        return model_error(e, 'advice failed', language=lang)
+    cache_advice(symptom, lang, result)
+    return jsonify({
+        'advice': result
+    })
 
 
-if __name__ == '__main__':
-    # Create templates directory if it doesn't exist
-    if not os.path.exists('templates'):
-        os.makedirs('templates')
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events):
+    if 'trace' in g:
+        g.trace_streamed = True
+        events = traced_stream(events, g.trace)
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Streaming translation endpoint: sends each section as a server-sent event as soon as it is complete
+@app.route('/api/translate/stream', methods=['POST'])
+def translate_stream():
+    data = request.json
+    text = data.get('text', '')
+    lang = data.get('language', 'chinese')
+    direction = data.get('direction', 'hospital_to_patient')
     
-    # Create index.html (Home page with language selection)
-    with open('templates/index.html', 'w', encoding='utf-8') as f:
-        f.write('''<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Mendy - Medical Translator</title>
-    <style>
-        * { margin: 0; padding: 0; box-sizing: border-box; }
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-            padding: 20px;
-        }
-        .container {
-            max-width: 500px;
-            margin: 0 auto;
-            background: white;
-            border-radius: 20px;
-            padding: 30px;
-            box-shadow: 0 20px 60px rgba(0,0,0,0.3);
-        }
-        .header { text-align: center; margin-bottom: 30px; }
-        .avatar {
-            width: 80px;
-            height: 80px;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            border-radius: 50%;
-            margin: 0 auto 15px;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            font-size: 40px;
-        }
-        h1 { color: #333; font-size: 24px; margin-bottom: 10px; }
-        .subtitle { color: #666; font-size: 16px; margin-bottom: 30px; }
-        .language-label {
-            display: block;
-            color: #333;
-            font-weight: 600;
-            margin-bottom: 15px;
-            text-align: center;
-            font-size: 14px;
-        }
-        .language-buttons {
-            display: grid;
-            grid-template-columns: 1fr 1fr 1fr;
-            gap: 10px;
-            margin-bottom: 30px;
-        }
-        .lang-btn {
-            padding: 15px 10px;
-            border: 2px solid #e0e0e0;
-            border-radius: 12px;
-            background: white;
-            cursor: pointer;
-            transition: all 0.3s;
-            font-size: 14px;
-            font-weight: 600;
-            color: #666;
-        }
-        .lang-btn:hover { border-color: #667eea; transform: translateY(-2px); }
-        .lang-btn.active {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            border-color: transparent;
-        }
-        .lang-flag { font-size: 24px; display: block; margin-bottom: 5px; }
-        .action-buttons { display: none; }
-        .action-buttons.active { display: block; animation: fadeIn 0.3s ease-in; }
-        @keyframes fadeIn {
-            from { opacity: 0; transform: translateY(10px); }
-            to { opacity: 1; transform: translateY(0); }
-        }
-        .btn {
-            width: 100%;
-            padding: 18px;
-            margin: 10px 0;
-            border: none;
-            border-radius: 12px;
-            font-size: 16px;
-            font-weight: 600;
-            cursor: pointer;
-            transition: all 0.3s;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            text-decoration: none;
-            display: block;
-            text-align: center;
-        }
-        .btn:hover { transform: translateY(-2px); box-shadow: 0 10px 20px rgba(0,0,0,0.2); }
-        .btn-secondary { background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%); }
-        small { display: block; margin-top: 5px; font-weight: 400; }
-        .disclaimer {
-            text-align: center;
-            font-size: 12px;
-            color: #666;
-            margin-top: 12px;
-            line-height: 1.4;
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <div class="avatar">🏥</div>
-            <h1>Hi, I'm Mendy</h1>
-            <p class="subtitle">Your Medical Translator</p>
-        </div>
-        
-        <label class="language-label">Select Your Language / 选择语言 / اپنی زبان منتخب کریں / Paw wo kasa</label>
-        <div class="language-buttons">
-            <button class="lang-btn" onclick="selectLanguage('chinese')">
-                <span class="lang-flag">🇨🇳</span>
-                中文<br>Chinese
-            </button>
-            <button class="lang-btn" onclick="selectLanguage('urdu')">
-                <span class="lang-flag">🇵🇰</span>
-                اردو<br>Urdu
-            </button>
-            <button class="lang-btn" onclick="selectLanguage('twi')">
-                <span class="lang-flag">🇬🇭</span>
-                Twi<br>Akan
-            </button>
-        </div>
-        
-        <div id="chinese-actions" class="action-buttons">
-            <a href="/realtime?lang=chinese" class="btn">
-                🔄 I'm at the hospital and need realtime translation<br>
-                <small>我在医院需要实时翻译</small>
-            </a>
-            <a href="/preparation?lang=chinese" class="btn btn-secondary">
-                📋 I need to go to the hospital<br>
-                <small>我需要去医院</small>
-            </a>
-        </div>
-        
-        <div id="urdu-actions" class="action-buttons">
-            <a href="/realtime?lang=urdu" class="btn">
-                🔄 I'm at the hospital and need realtime translation<br>
-                <small>مجھے ہسپتال میں فوری ترجمہ کی ضرورت ہے</small>
-            </a>
-            <a href="/preparation?lang=urdu" class="btn btn-secondary">
-                📋 I need to go to the hospital<br>
-                <small>مجھے ہسپتال جانے کی ضرورت ہے</small>
-            </a>
-        </div>
-        
-        <div id="twi-actions" class="action-buttons">
-            <a href="/realtime?lang=twi" class="btn">
-                🔄 I'm at the hospital and need realtime translation<br>
-                <small>Mewɔ ayaresabea na mehia nkyerɛaseɛ ntɛm</small>
-            </a>
-            <a href="/preparation?lang=twi" class="btn btn-secondary">
-                📋 I need to go to the hospital<br>
-                <small>Ɛsɛ sɛ mekɔ ayaresabea</small>
-            </a>
-        </div>
-        <p class="disclaimer">Mendy does not collect any personal information. Do not input sensitive information.</p>
-    </div>
+    if not text:
+        return jsonify({'error': 'No text provided'}), 400
     
-    <script>
-        function selectLanguage(lang) {
-            document.querySelectorAll('.lang-btn').forEach(btn => btn.classList.remove('active'));
-            event.target.closest('.lang-btn').classList.add('active');
-            document.querySelectorAll('.action-buttons').forEach(div => div.classList.remove('active'));
-            document.getElementById(lang + '-actions').classList.add('active');
-        }
-    </script>
-</body>
-</html>''')
+    cache_key = phrasebook_key(text, lang, direction)
+    cached = lookup_cached(cache_key)
+    log.info('translate', extra={'fields': {
+        'language': lang, 'direction': direction, 'text': text, 'cached': cached is not None, 'stream': True}})
     
-    # Create realtime.html (Translation page)
-    with open('templates/realtime.html', 'w', encoding='utf-8') as f:
-        f.write('''<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{{ config.realtime_title }}</title>
-    <style>
-        * { margin: 0; padding: 0; box-sizing: border-box; }
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-            padding: 20px;
-        }
-        .container {
-            max-width: 500px;
-            margin: 0 auto;
-            background: white;
-            border-radius: 20px;
-            padding: 30px;
-            box-shadow: 0 20px 60px rgba(0,0,0,0.3);
-        }
-        .header { text-align: center; margin-bottom: 30px; }
-        h1 { color: #333; font-size: 24px; margin-bottom: 10px; }
-        textarea {
-            width: 100%;
-            padding: 15px;
-            border: 2px solid #e0e0e0;
-            border-radius: 12px;
-            font-size: 16px;
-            resize: vertical;
-            min-height: 100px;
-            font-family: inherit;
-        }
-        textarea:focus { outline: none; border-color: #667eea; }
-        .quick-questions { display: flex; flex-wrap: wrap; gap: 8px; margin-top: 10px; }
-        .quick-btn {
-            padding: 8px 15px;
-            background: #f0f0f0;
-            border: none;
-            border-radius: 20px;
-            font-size: 14px;
-            cursor: pointer;
-            transition: all 0.2s;
-        }
-        .quick-btn:hover { background: #e0e0e0; }
-        .btn {
-            width: 100%;
-            padding: 15px;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            border: none;
-            border-radius: 12px;
-            font-size: 16px;
-            font-weight: 600;
-            cursor: pointer;
-            margin-top: 10px;
-        }
-        .direction-row { display:flex; gap:8px; margin-bottom:12px; }
-        .direction-btn {
-            flex: 1;
-            padding: 12px;
-            border-radius: 10px;
-            font-size: 14px;
-            font-weight: 600;
-            border: none;
-            cursor: pointer;
-            background: #f0f0f0;
-            color: #333;
-            transition: all 0.2s;
-        }
-        .direction-btn.active {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-        }
-        .btn:hover { opacity: 0.9; }
-        .btn:disabled { opacity: 0.5; cursor: not-allowed; }
-        .result-box {
-            margin-top: 20px;
-            padding: 20px;
-            background: #f8f9fa;
-            border-radius: 12px;
-            display: none;
-        }
-        .result-box.active { display: block; animation: fadeIn 0.3s ease-in; }
-        @keyframes fadeIn {
-            from { opacity: 0; transform: translateY(10px); }
-            to { opacity: 1; transform: translateY(0); }
-        }
-        .result-section { margin-bottom: 20px; }
-        .result-section:last-child { margin-bottom: 0; }
-        .result-title {
-            font-weight: 600;
-            color: #667eea;
-            margin-bottom: 8px;
-            font-size: 14px;
-        }
-        .result-content {
-            color: #333;
-            font-size: 16px;
-            line-height: 1.6;
-            white-space: pre-wrap;
-        }
-        .back-btn {
-            background: #6c757d;
-            text-decoration: none;
-            display: block;
-            text-align: center;
-            margin-top: 20px;
-        }
-        .back-btn:hover { background: #5a6268; }
-        .loading { text-align: center; color: #667eea; padding: 20px; display: none; }
-        .loading.active { display: block; }
-        .spinner {
-            border: 3px solid #f3f3f3;
-            border-top: 3px solid #667eea;
-            border-radius: 50%;
-            width: 30px;
-            height: 30px;
-            animation: spin 1s linear infinite;
-            margin: 0 auto 10px;
-        }
-        @keyframes spin {
-            0% { transform: rotate(0deg); }
-            100% { transform: rotate(360deg); }
-        }
-        .error { background: #fee; color: #c33; padding: 15px; border-radius: 8px; margin-top: 10px; display: none; }
-        .error.active { display: block; }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>{{ config.realtime_title }}</h1>
-        </div>
-        
-        <div class="direction-row">
-            <button id="dirHospital" class="direction-btn active" onclick="setDirection('hospital_to_patient')">{{ config.direction_hospital_to_patient_label }}</button>
-            <button id="dirPatient" class="direction-btn" onclick="setDirection('patient_to_hospital')">{{ config.direction_patient_to_hospital_label }}</button>
-        </div>
-        <textarea id="inputText" placeholder="{{ config.input_placeholder }}"></textarea>
-        <div id="quickQuestions" class="quick-questions"></div>
-    <button class="btn" id="translateBtn" onclick="translateText()">{{ config.translate_btn }}</button>
-        
-        <div class="error" id="errorBox"></div>
-        
-        <div class="loading" id="loading">
-            <div class="spinner"></div>
-            {{ config.translating }}
-        </div>
-        
-        <div id="resultBox" class="result-box">
-            <div class="result-section">
-                <div class="result-title">📝 Translation</div>
-                <div class="result-content" id="translation"></div>
-            </div>
-            <div class="result-section">
-                <div class="result-title">💡 Context</div>
-                <div class="result-content" id="context"></div>
-            </div>
-            <div class="result-section">
-                <div class="result-title" id="responsesTitle">💬 Possible Responses</div>
-                <div class="result-content" id="responses"></div>
-            </div>
-        </div>
-        
-        <a href="/" class="btn back-btn">{{ config.back_btn }}</a>
-    </div>
+    def suggestions(result):
+        # The patient's likely replies, for the page to offer as buttons; the same ones are prefetched
+        if direction == 'hospital_to_patient':
+            yield sse_event('suggestions', {'texts': suggested_responses(result['responses'], prefetcher.depth)})
     
-    <script>
-        const currentLanguage = "{{ language }}";
-        let currentDirection = 'hospital_to_patient';
-        // patient quick questions provided via Jinja into JS
-        const patientQuickQuestions = {{ config.patient_quick_questions | tojson }};
-
-        // default hospital quick questions (English)
-        const hospitalQuickQuestions = [
-            'Do you have insurance?',
-            'What brings you in today?',
-            'Any allergies?',
-            'When did the symptoms start?'
-        ];
-
-        function renderQuickQuestions() {
-            const container = document.getElementById('quickQuestions');
-            container.innerHTML = '';
-            const list = currentDirection === 'patient_to_hospital' ? patientQuickQuestions : hospitalQuickQuestions;
-            list.forEach(q => {
-                const btn = document.createElement('button');
-                btn.className = 'quick-btn';
-                btn.type = 'button';
-                btn.textContent = q;
-                btn.onclick = () => setQuickQuestion(q);
-                container.appendChild(btn);
-            });
-        }
-
-        function setDirection(dir) {
-            currentDirection = dir;
-            const hospitalBtn = document.getElementById('dirHospital');
-            const patientBtn = document.getElementById('dirPatient');
-            if (dir === 'hospital_to_patient') {
-                hospitalBtn.classList.add('active');
-                patientBtn.classList.remove('active');
-                // render english quick questions
-                renderQuickQuestions();
-            } else {
-                patientBtn.classList.add('active');
-                hospitalBtn.classList.remove('active');
-                // render patient-language quick questions
-                renderQuickQuestions();
-            }
-            // Update responses title depending on direction
-            const responsesTitle = document.getElementById('responsesTitle');
-            if (responsesTitle) {
-                responsesTitle.textContent = dir === 'patient_to_hospital' ? '💬 You Can Expand On' : '💬 Possible Responses';
-            }
-        }
-        
-        function setQuickQuestion(text) {
-            document.getElementById('inputText').value = text;
-        }
-        
-        async function translateText() {
-            const text = document.getElementById('inputText').value;
-            if (!text.trim()) {
-                showError('Please enter some text to translate!');
-                return;
-            }
-            
-            const btn = document.getElementById('translateBtn');
-            btn.disabled = true;
-            
-            document.getElementById('loading').classList.add('active');
-            document.getElementById('resultBox').classList.remove('active');
-            document.getElementById('errorBox').classList.remove('active');
-            
-            try {
-                const response = await fetch('/api/translate', {
-                    method: 'POST',
-                    headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify({text: text, language: currentLanguage, direction: currentDirection})
-                });
-                
-                if (!response.ok) throw new Error('Translation failed');
-                
-                const data = await response.json();
-                
-                document.getElementById('translation').textContent = data.translation;
-                document.getElementById('context').textContent = data.context;
-                document.getElementById('responses').textContent = data.responses;
-                
-                document.getElementById('loading').classList.remove('active');
-                document.getElementById('resultBox').classList.add('active');
-            } catch (error) {
-                document.getElementById('loading').classList.remove('active');
-                showError('Translation error. Please check your API key and try again.');
-            } finally {
-                btn.disabled = false;
-            }
-        }
-        
-        function showError(message) {
-            const errorBox = document.getElementById('errorBox');
-            errorBox.textContent = message;
-            errorBox.classList.add('active');
-        }
-        // Initialize quick questions on load (hospital -> patient default)
-        window.addEventListener('DOMContentLoaded', function() {
-            // ensure default button state
-            document.getElementById('dirHospital').classList.add('active');
-            document.getElementById('dirPatient').classList.remove('active');
-            renderQuickQuestions();
-            // ensure responses title matches default direction
-            const responsesTitleInit = document.getElementById('responsesTitle');
-            if (responsesTitleInit) {
-                responsesTitleInit.textContent = '💬 Possible Responses';
-            }
-        });
-    </script>
-</body>
-</html>''')
+    def emit(result, parsed):
+        for name in SECTION_NAMES:
+            yield sse_event(name, {'text': result[name]})
+        if parsed:
+            yield from suggestions(result)
+        yield sse_event('done', {})
     
-# Create preparation.html (Hospital preparation page)
-    with open('templates/preparation.html', 'w', encoding='utf-8') as f:
-        f.write('''<!DOCTYPE html>
-<html lang="en">
-<head>
-    <script src="https://cdn.jsdelivr.net/npm/marked/marked.min.js"></script>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{{ config.preparation_title }}</title>
-    <style>
-        * { margin: 0; padding: 0; box-sizing: border-box; }
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-            padding: 20px;
-        }
-        .container {
-            max-width: 500px;
-            margin: 0 auto;
-            background: white;
-            border-radius: 20px;
-            padding: 30px;
-            box-shadow: 0 20px 60px rgba(0,0,0,0.3);
-        }
-        .header { text-align: center; margin-bottom: 30px; }
-        h1 { color: #333; font-size: 24px; margin-bottom: 10px; }
-        textarea {
-            width: 100%;
-            padding: 15px;
-            border: 2px solid #e0e0e0;
-            border-radius: 12px;
-            font-size: 16px;
-            resize: vertical;
-            min-height: 100px;
-            font-family: inherit;
-        }
-        textarea:focus { outline: none; border-color: #667eea; }
-        .quick-questions { display: flex; flex-wrap: wrap; gap: 8px; margin-top: 10px; }
-        .quick-btn {
-            padding: 8px 15px;
-            background: #f0f0f0;
-            border: none;
-            border-radius: 20px;
-            font-size: 14px;
-            cursor: pointer;
-            transition: all 0.2s;
-        }
-        .quick-btn:hover { background: #e0e0e0; }
-        .btn {
-            width: 100%;
-            padding: 15px;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            border: none;
-            border-radius: 12px;
-            font-size: 16px;
-            font-weight: 600;
-            cursor: pointer;
-            margin-top: 10px;
-        }
-        .btn:hover { opacity: 0.9; }
-        .btn:disabled { opacity: 0.5; cursor: not-allowed; }
-        .result-box {
-            margin-top: 20px;
-            padding: 20px;
-            background: #f8f9fa;
-            border-radius: 12px;
-            display: none;
-        }
-        .result-box.active { display: block; animation: fadeIn 0.3s ease-in; }
-        @keyframes fadeIn {
-            from { opacity: 0; transform: translateY(10px); }
-            to { opacity: 1; transform: translateY(0); }
-        }
-        .result-content {
-            color: #333;
-            font-size: 16px;
-            line-height: 1.6;
-            white-space: pre-wrap;
-        }
-        .back-btn {
-            background: #6c757d;
-            text-decoration: none;
-            display: block;
-            text-align: center;
-            margin-top: 20px;
-            padding: 15px;
-            color: white;
-            border-radius: 12px;
-            font-weight: 600;
-        }
-        .back-btn:hover { background: #5a6268; }
-        .loading { text-align: center; color: #667eea; padding: 20px; display: none; }
-        .loading.active { display: block; }
-        .spinner {
-            border: 3px solid #f3f3f3;
-            border-top: 3px solid #667eea;
-            border-radius: 50%;
-            width: 30px;
-            height: 30px;
-            animation: spin 1s linear infinite;
-            margin: 0 auto 10px;
-        }
-        @keyframes spin {
-            0% { transform: rotate(0deg); }
-            100% { transform: rotate(360deg); }
-        }
-        .error { background: #fee; color: #c33; padding: 15px; border-radius: 8px; margin-top: 10px; display: none; }
-        .error.active { display: block; }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>{{ config.preparation_title }}</h1>
-        </div>
-        
-        <textarea id="symptomText" placeholder="{{ config.symptom_placeholder }}"></textarea>
-        <div class="quick-questions">
-            {% if language == 'chinese' %}
-            <button class="quick-btn" onclick="setSymptom('我发烧了')">我发烧了 Fever</button>
-            <button class="quick-btn" onclick="setSymptom('我肚子疼')">我肚子疼 Stomach pain</button>
-            <button class="quick-btn" onclick="setSymptom('我头痛')">我头痛 Headache</button>
-            <button class="quick-btn" onclick="setSymptom('我咳嗽')">我咳嗽 Cough</button>
-            {% elif language == 'urdu' %}
-            <button class="quick-btn" onclick="setSymptom('مجھے بخار ہے')">مجھے بخار ہے Fever</button>
-            <button class="quick-btn" onclick="setSymptom('میرے پیٹ میں درد ہے')">میرے پیٹ میں درد ہے Stomach pain</button>
-            <button class="quick-btn" onclick="setSymptom('میرے سر میں درد ہے')">میرے سر میں درد ہے Headache</button>
-            <button class="quick-btn" onclick="setSymptom('مجھے کھانسی ہے')">مجھے کھانسی ہے Cough</button>
-            {% elif language == 'twi' %}
-            <button class="quick-btn" onclick="setSymptom('Mewɔ atiridiì')">Mewɔ atiridiì Fever</button>
-            <button class="quick-btn" onclick="setSymptom('Me yam ye me ya')">Me yam ye me ya Stomach pain</button>
-            <button class="quick-btn" onclick="setSymptom('Me tire ye me ya')">Me tire ye me ya Headache</button>
-            <button class="quick-btn" onclick="setSymptom('Meworɔ')">Meworɔ Cough</button>
-            {% endif %}
-        </div>
-        <button class="btn" id="adviceBtn" onclick="getAdvice()">{{ config.advice_btn }}</button>
-        
-        <div class="error" id="errorBox"></div>
-        
-        <div class="loading" id="loading">
-            <div class="spinner"></div>
-            {{ config.analyzing }}
-        </div>
-        
-        <div id="adviceBox" class="result-box">
-            <div class="result-content" id="advice"></div>
-        </div>
-        
-        <a href="/" class="btn back-btn">{{ config.back_btn }}</a>
-    </div>
+    def failed(e, streamed):
+        # Before any section went out, an expired cache entry is better than an error
+        stale = None if streamed else stale_translation(cache_key, e)
+        if stale is not None:
+            yield from emit(stale, True)
+            return
+        log.exception('translate stream failed', extra={'fields': {'language': lang}})
+        yield sse_event('error', {'error': f'{type(e).__name__}: {str(e)}'})
     
-    <script>
-        const currentLanguage = "{{ language }}";
-        
-        function setSymptom(text) {
-            document.getElementById('symptomText').value = text;
-        }
-        
-        async function getAdvice() {
-            const text = document.getElementById('symptomText').value;
-            if (!text.trim()) {
-                showError('Please describe your symptoms!');
-                return;
-            }
-            
-            const btn = document.getElementById('adviceBtn');
-            btn.disabled = true;
+    def follow(future):
+        # Another request is already translating this phrase; send its result once it is ready
+        try:
+            result = future.result()
+        except Abandoned:
+            result = fetch_translation(text, lang, direction, cache_key)
+        # Only parsed results are cached
+        yield from emit(result, translation_cache.get_stale(cache_key) is not None)
+    
+    def lead(future):
+        # Followers get the result as soon as it is known; if this client disconnects
+        # first, they are told to translate on their own
+        outcome = {'error': Abandoned('the streaming client disconnected')}
+        streamed = False
+        try:
+            prompt = prompt_template(lang, direction, 'sections').render(text)
+            parser = IncrementalParser()
+            for chunk in backend.stream(prompt, limits=output_limits(lang, 'translate')):
+                # A section is complete once the header of the following section has arrived
+                for name, section in parser.feed(chunk):
+                    streamed = True
+                    yield sse_event(name, {'text': section})
             
-            document.getElementById('loading').classList.add('active');
-            document.getElementById('adviceBox').classList.remove('active');
-            document.getElementById('errorBox').classList.remove('active');
+            try:
+                closing = parser.close()
+                result = parser.result()
+                parsed = True
+            except ParseError as parse_error:
+                PARSE_FAILURES.inc('stream', lang)
+                log.warning('reply parse failed', extra={'fields': {
+                    'language': lang, 'error': str(parse_error), 'reply': parser.content}})
+                result = {
+                    'translation': parser.content,
+                    'context': 'Raw response (parsing failed)',
+                    'responses': 'See translation above'
+                }
+                closing = [(name, result[name]) for name in SECTION_NAMES]
+                parsed = False
+            if parsed:
+                cache_translation(cache_key, result)
+            outcome = {'result': result}
+            translation_flights.settle(cache_key, future, **outcome)
+            streamed = True
             
-            try {
-                const response = await fetch('/api/advice', {
-                    method: 'POST',
-                    headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify({symptom: text, language: currentLanguage})
-                });
-                
-                if (!response.ok) throw new Error('Advice request failed');
-                
-                const data = await response.json();
-                
-                document.getElementById('advice').innerHTML = marked.parse(data.advice);
-                document.getElementById('loading').classList.remove('active');
-                document.getElementById('adviceBox').classList.add('active');
-            } catch (error) {
-                document.getElementById('loading').classList.remove('active');
-                showError('Error getting advice. Please check your API key and try again.');
-            } finally {
-                btn.disabled = false;
-            }
-        }
-        
-        function showError(message) {
-            const errorBox = document.getElementById('errorBox');
-            errorBox.textContent = message;
-            errorBox.classList.add('active');
-        }
-    </script>
-</body>
-</html>''')
+            for name, section in closing:
+                yield sse_event(name, {'text': section})
+            if parsed:
+                yield from suggestions(result)
+            yield sse_event('done', {})
+        except Exception as e:
+            if 'error' in outcome:
+                outcome = {'error': e}
+            yield from failed(e, streamed)
+        finally:
+            if 'error' in outcome:
+                translation_flights.settle(cache_key, future, **outcome)
+    
+    def generate():
+        if cached is not None:
+            yield from emit(cached, True)
+            return
         
+        # Identical streams in flight share one model call, like /api/translate
+        future, leader = translation_flights.claim(cache_key)
+        try:
+            yield from (lead if leader else follow)(future)
+        except Exception as e:
+            # Only follow() gets here, before sending anything
+            yield from failed(e, False)
+    
+    return sse_response(generate())
+
+
+# Fan-out endpoint: one phrase into every configured language (or the given `languages`) at once.
+# Each language is its own translate call on its own thread, and is sent as a server-sent event as
+# soon as it completes, so the whole takes as long as the slowest language rather than their sum.
+@app.route('/api/translate/all', methods=['POST'])
+def translate_all():
+    data = request.json
+    text = data.get('text', '')
+    direction = data.get('direction', 'hospital_to_patient')
+    languages = data.get('languages') or list(LANGUAGE_CONFIG)
+    
+    if not text:
+        return jsonify({'error': 'No text provided'}), 400
+    if not isinstance(languages, list) or not all(lang in LANGUAGE_CONFIG for lang in languages):
+        return jsonify({'error': f"languages must be a list of: {', '.join(LANGUAGE_CONFIG)}"}), 400
+    # Only an English phrase can be meant for every language; a patient speaks just one
+    if direction != DIRECTIONS[0]:
+        return jsonify({'error': f'direction must be {DIRECTIONS[0]}'}), 400
+    
+    cached, pending = {}, []
+    with phase('cache'):
+        for lang in dict.fromkeys(languages):
+            cache_key = phrasebook_key(text, lang, direction)
+            result = lookup_cached(cache_key)
+            if result is None:
+                pending.append((lang, cache_key))
+            else:
+                cached[lang] = result
+            log.info('translate', extra={'fields': {
+                'language': lang, 'direction': direction, 'text': text, 'cached': result is not None,
+                'fan_out': True}})
+    
+    def generate():
+        for lang, result in cached.items():
+            yield sse_event('translation', {'language': lang, 'cached': True, **result})
+        if pending:
+            with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+                futures = {pool.submit(fetch_or_stale, text, lang, direction, cache_key): lang
+                           for lang, cache_key in pending}
+                for future in as_completed(futures):
+                    lang = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        log.warning('fan-out translation failed', extra={'fields': {
+                            'language': lang, 'error': f'{type(e).__name__}: {e}'}})
+                        yield sse_event('error', {'language': lang, 'error': f'{type(e).__name__}: {str(e)}'})
+                        continue
+                    yield sse_event('translation', {'language': lang, 'cached': False, **result})
+        yield sse_event('done', {})
+    
+    return sse_response(generate())
+
+
+# Streaming advice endpoint: forwards model output as it is generated
+@app.route('/api/advice/stream', methods=['POST'])
+def advice_stream():
+    data = request.json
+    symptom = data.get('symptom', '')
+    lang = data.get('language', 'chinese')
+    
+    if not symptom:
+        return jsonify({'error': 'No symptom provided'}), 400
+    
+    with phase('cache'):
+        cached = lookup_advice(symptom, lang)
+    log.info('advice', extra={'fields': {
+        'language': lang, 'text': symptom, 'cached': cached is not None, 'stream': True}})
+    prompt = prompt_template(lang, None, 'advice').render(symptom)
+    
+    def generate():
+        if cached is not None:
+            yield sse_event('chunk', {'text': cached})
+            yield sse_event('done', {})
+            return
+        try:
+            chunks = []
+            for chunk in backend.stream(prompt, limits=output_limits(lang, 'advice')):
+                chunks.append(chunk)
+                yield sse_event('chunk', {'text': chunk})
+            yield sse_event('done', {})
+            cache_advice(symptom, lang, ''.join(chunks))
+        except Exception as e:
+            log.exception('advice stream failed', extra={'fields': {'language': lang}})
+            yield sse_event('error', {'error': f'{type(e).__name__}: {str(e)}'})
+    
+    return sse_response(generate())
+
+# Translation cache statistics
+@app.route('/api/cache/stats')
+def cache_stats():
+    return jsonify({**translation_cache.stats(), 'single_flight': translation_flights.stats(),
+                    'semantic': {'translation': semantic_translations.stats(), 'advice': semantic_advice.stats()},
+                    'shared': shared_cache.stats(), 'prefetch': prefetcher.stats()})
+
+
+# Prometheus metrics
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+# Generate phrasebook.json for every quick question, language and direction
+@app.cli.command('build-phrasebook')
+def build_phrasebook():
+    entries = []
+    for lang, config in LANGUAGE_CONFIG.items():
+        questions = [(q, 'hospital_to_patient') for q in HOSPITAL_QUICK_QUESTIONS]
+        questions += [(q, 'patient_to_hospital') for q in config['patient_quick_questions']]
+        for text, direction in questions:
+            result, parsed = translate_text(text, lang, direction)
+            if not parsed:
+                print(f"⚠️ Skipping {lang}/{direction} '{text}': reply could not be parsed")
+                continue
+            entries.append({'text': text, 'language': lang, 'direction': direction, **result})
+    write_phrasebook(PHRASEBOOK_PATH, entries, backend.model_name)
+    print(f"✅ Wrote {len(entries)} phrasebook entries to {PHRASEBOOK_PATH}")
+
+
+# Precompile templates/ into TEMPLATE_CACHE_DIR, rewriting only templates whose source changed
+@app.cli.command('build-templates')
+def build_templates():
+    changed = compile_templates(app, TEMPLATE_CACHE_DIR)
+    print(f"✅ Compiled {len(changed)} changed template(s) into {TEMPLATE_CACHE_DIR}")
+
+
+# Sum a day's usage rollup (default today, UTC) by model, endpoint, language and direction
+@app.cli.command('usage-report')
+@click.argument('day', required=False)
+def usage_report(day):
+    path = rollup_path(USAGE_DIR or 'usage', day or time.strftime('%Y-%m-%d', time.gmtime()))
+    if not os.path.exists(path):
+        print(f"⚠️ No usage rollup at {path}")
+        sys.exit(1)
+    summary = summarize(path, parse_prices(os.getenv('MODEL_PRICES')))
+    print(f"{'model':<24}{'endpoint':<17}{'language':<10}{'direction':<21}"
+          f"{'calls':>8}{'input':>11}{'output':>11}{'out/call':>10}{'s/call':>8}{'cut':>6}{'USD':>10}")
+    for (model, endpoint, language, direction), totals in sorted(summary.items()):
+        calls = totals['calls'] or 1
+        cost = '-' if totals['cost_usd'] is None else f"{totals['cost_usd']:.4f}"
+        print(f"{model:<24}{endpoint:<17}{language:<10}{direction:<21}{totals['calls']:>8}"
+              f"{totals['input_tokens']:>11}{totals['output_tokens']:>11}{totals['output_tokens'] / calls:>10.1f}"
+              f"{totals['model_seconds'] / calls:>8.2f}{totals['truncated']:>6}{cost:>10}")
+
+
+# Serve a SQLite store over the Redis protocol, as a local stand-in for SHARED_CACHE_URL=redis://
+@app.cli.command('cache-server')
+@click.option('--host', default='127.0.0.1')
+@click.option('--port', default=6379)
+@click.option('--path', default='shared-cache.db', help='SQLite file holding the entries')
+@click.option('--max-mb', default=64.0, help='size budget before the least recently read entries are evicted')
+def cache_server(host, port, path, max_mb):
+    server = RESPServer((host, port), SQLiteStore(path, int(max_mb * 1024 * 1024)))
+    print(f"🗄️ Serving {path} on redis://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+# Pre-translate the most frequent uncached requests in recorded JSON logs (plain or .gz)
+@app.cli.command('warm-cache')
+@click.argument('logs', nargs=-1, required=True)
+@click.option('--concurrency', default=4, help='model calls in flight at once')
+@click.option('--max-calls', default=500, help='most model calls to make')
+@click.option('--max-seconds', default=600.0, help='start no new calls after this many seconds')
+@click.option('--min-count', default=2, help='skip requests seen fewer times than this')
+@click.option('--dry-run', is_flag=True, help='report coverage without making model calls')
+def warm_cache(logs, concurrency, max_calls, max_seconds, min_count, dry_run):
+    if shared_cache.store is None and not dry_run:
+        print("⚠️ SHARED_CACHE_URL is not set; warmed entries would be lost when this command exits")
+        sys.exit(1)
+    counts, texts = read_requests(read_logs(logs))
+    # Only languages and directions this deploy serves
+    counts = Counter({key: count for key, count in counts.items()
+                      if key[1] in LANGUAGE_CONFIG and key[2] in DIRECTIONS})
+    report = warm(counts, texts, lambda key: lookup_cached(key) is not None, fetch_translation,
+                  concurrency, max_calls, max_seconds, min_count, dry_run)
+    print(f"{'✅' if not report['failed'] else '⚠️'} {report['requests']} recorded requests, "
+          f"{report['distinct']} distinct: {report['already_cached']} already cached, {report['warmed']} warmed, "
+          f"{report['failed']} failed, {report['skipped']} skipped")
+    print(f"📈 Recorded traffic answered from cache: {report['coverage_before']:.1%} before, "
+          f"{report['coverage']:.1%} after warm-up{' (dry run)' if dry_run else ''}")
+
+
+# Print the models the configured backend offers (makes a network call)
+@app.cli.command('list-models')
+def list_models():
+    for name, methods in backend.list_models():
+        print(name, methods)
+
+
+if __name__ == '__main__':
     print("🏥 Starting Mendy Medical Translator...")
     print("📱 Open http://localhost:5001 in your browser")
-    print("✅ Templates created successfully!")
-    app.run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5001)
@@ -0,0 +1,113 @@
+"""
+Structured, queue-backed logging for Mendy.
+
+Request handlers log through the standard `logging` module under the
+"mendy" logger. setup_logging() installs a QueueHandler, so a log call in a
+request only formats the record and puts it on an in-memory queue. A
+background QueueListener thread does the actual writing. A slow stdout or
+log shipper therefore never blocks or serializes the workers.
+
+Environment:
+    LOG_LEVEL                 DEBUG, INFO (default), WARNING, ...
+    LOG_FORMAT                json (default, one object per line) or text
+    LOG_RESPONSE_SAMPLE_RATE  fraction of model reply bodies to log (default 0.01)
+
+Structured fields go in `extra={'fields': {...}}` and become top-level keys
+of the JSON line.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+LOG_RESPONSE_SAMPLE_RATE = float(os.getenv('LOG_RESPONSE_SAMPLE_RATE', '0.01'))
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value!r}' for key, value in fields.items())
+        return line
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps `fields` and exception text as data instead of
+    pre-rendering the whole record into a string on the calling thread."""
+
+    def prepare(self, record):
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(stream=None, level=None, fmt=None):
+    """Route the "mendy" logger through a queue to `stream` (default stderr).
+    Safe to call more than once; later calls replace the earlier setup."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    fmt = fmt or os.getenv('LOG_FORMAT', 'json')
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else
+                        TextFormatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger('mendy')
+    logger.handlers = [StructuredQueueHandler(log_queue)]
+    logger.setLevel(level or os.getenv('LOG_LEVEL', 'INFO').upper())
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    return logger
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+def get_logger(name):
+    return logging.getLogger(f'mendy.{name}')
+
+
+def sample_response():
+    """True for the fraction of requests whose model reply body should be logged."""
+    return LOG_RESPONSE_SAMPLE_RATE > 0 and random.random() < LOG_RESPONSE_SAMPLE_RATE
@@ -0,0 +1,183 @@
+"""
+Asyncio serving mode for Mendy.
+
+/api/translate and /api/advice are handled natively here and await the
+backend's async generate call. One process can then hold hundreds of
+in-flight model calls, each costing a coroutine rather than a worker thread.
+Every other route (pages, streaming, cache stats, metrics) is passed through to the
+Flask app in app.py. With a shared cache configured, cache lookups and writes
+run on worker threads so the store's disk or network I/O never blocks the loop.
+
+Dependencies:
+pip install uvicorn asgiref
+
+Run:
+uvicorn asgi:app --port 5001
+"""
+
+import asyncio
+import json
+import math
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+
+from applog import get_logger
+from cache import AsyncSingleFlight
+from admission import OverloadedError
+from resilience import CircuitOpenError
+from tracing import end_trace, phase, start_trace
+from app import (app as flask_app, backend, cache_advice, cache_translation, client_id, lookup_advice,
+                 lookup_cached, observe_request, output_limits, phrasebook_key, prompt_template, rate_limiter,
+                 shared_cache, stale_translation, translate_text_async)
+
+flask_asgi = WsgiToAsgi(flask_app)
+log = get_logger('asgi')
+
+# A waiting model call costs a coroutine here rather than a worker thread, so allow many more
+if getattr(backend, 'limiter', None) is not None:
+    backend.limiter.use_mode('asyncio')
+
+# Concurrent identical translations on the event loop share one model call
+translation_flights = AsyncSingleFlight()
+
+
+async def cache_io(fn, *args):
+    """Run a cache lookup or write off the event loop when it may reach the shared store."""
+    if shared_cache.store is None:
+        return fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+
+async def translate(data):
+    text = data.get('text', '')
+    lang = data.get('language', 'chinese')
+    direction = data.get('direction', 'hospital_to_patient')
+
+    if not text:
+        return 400, {'error': 'No text provided'}
+
+    cache_key = phrasebook_key(text, lang, direction)
+    with phase('cache'):
+        cached = await cache_io(lookup_cached, cache_key)
+    log.info('translate', extra={'fields': {
+        'language': lang, 'direction': direction, 'text': text, 'cached': cached is not None}})
+    if cached is not None:
+        return 200, cached
+
+    async def call():
+        result, parsed = await translate_text_async(text, lang, direction)
+        if parsed:
+            await cache_io(cache_translation, cache_key, result)
+        return result
+    try:
+        return 200, await translation_flights.do(cache_key, call)
+    except Exception as e:
+        stale = stale_translation(cache_key, e)
+        if stale is None:
+            raise
+        return 200, stale
+
+
+async def advice(data):
+    symptom = data.get('symptom', '')
+    lang = data.get('language', 'chinese')
+
+    if not symptom:
+        return 400, {'error': 'No symptom provided'}
+
+    with phase('cache'):
+        cached = await cache_io(lookup_advice, symptom, lang)
+    log.info('advice', extra={'fields': {'language': lang, 'text': symptom, 'cached': cached is not None}})
+    if cached is not None:
+        return 200, {'advice': cached}
+    prompt = prompt_template(lang, None, 'advice').render(symptom)
+    result = await backend.generate_async(prompt, limits=output_limits(lang, 'advice'))
+    await cache_io(cache_advice, symptom, lang, result)
+    return 200, {'advice': result}
+
+
+ROUTES = {
+    '/api/translate': translate,
+    '/api/advice': advice
+}
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def send_json(send, status, payload, trace=None, extra_headers=()):
+    with phase('jsonify'):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    headers += extra_headers
+    if trace is not None:
+        trace.root.attributes['http.status_code'] = status
+        headers.append((b'server-timing', trace.server_timing().encode()))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': headers
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    handler = ROUTES.get(scope['path']) if scope['type'] == 'http' else None
+    if handler is None or scope['method'] != 'POST':
+        return await flask_asgi(scope, receive, send)
+
+    start = time.perf_counter()
+    headers = dict(scope['headers'])
+    trace = start_trace(f"POST {scope['path']}", headers.get(b'traceparent', b'').decode('latin-1'),
+                        **{'http.route': scope['path']})
+    try:
+        try:
+            with phase('decode'):
+                data = json.loads(await read_body(receive) or b'{}')
+        except ValueError:
+            return await send_json(send, 400, {'error': 'Request body must be JSON'}, trace)
+
+        wait = rate_limiter.allow(client_id(headers.get(b'x-api-key', b'').decode('latin-1'),
+                                            (scope.get('client') or ('',))[0]))
+        if wait:
+            await send_json(send, 429, {'error': 'Too many requests'}, trace,
+                            [(b'retry-after', str(math.ceil(wait)).encode())])
+            return observe_request(handler.__name__, data, 429, start)
+
+        extra_headers = []
+        try:
+            status, payload = await handler(data)
+        except (OverloadedError, CircuitOpenError) as e:
+            # Failed fast without calling the model (see admission.py and resilience.py)
+            log.warning(f"{scope['path']} failed", extra={'fields': {'error': str(e)}})
+            status = 429 if isinstance(e, OverloadedError) else 503
+            payload = {'error': f'{type(e).__name__}: {str(e)}'}
+            extra_headers.append((b'retry-after', str(math.ceil(e.retry_after)).encode()))
+        except Exception as e:
+            log.exception(f"{scope['path']} failed")
+            status = 504 if isinstance(e, TimeoutError) else 500
+            payload = {'error': f'{type(e).__name__}: {str(e)}'}
+        await send_json(send, status, payload, trace, extra_headers)
+        observe_request(handler.__name__, data, status, start)
+    finally:
+        end_trace(trace)
@@ -0,0 +1,569 @@
+"""
+Model backends for the translate and advice endpoints.
+
+Every backend exposes the same calls:
+    generate(prompt)             -> str              full reply text
+    stream(prompt)               -> iterator of str  reply text in chunks as it is generated
+    await generate_async(prompt) -> str              full reply text, for the asyncio serving path
+
+generate and generate_async take an optional json_schema; when given, the
+provider's structured-output mode is used and the reply is a JSON document.
+All three take optional output limits, {'max_output_tokens': int,
+'stop_sequences': [str]}, passed to the provider as generation config. A
+reply cut off at max_output_tokens is reported as truncated (see usage.py).
+Each backend's `output_scale` is the default factor on those budgets
+(MAX_OUTPUT_TOKENS_SCALE in app.py overrides it).
+All three also take an optional per-call timeout in seconds, passed to the SDK.
+
+The backend is chosen with TRANSLATOR_BACKEND (gemini, openai or stub). The
+stub backend needs no API key and returns well-formed TRANSLATION/CONTEXT/
+RESPONSES replies after STUB_LATENCY_MS, for load tests and benchmarks.
+
+Prompts built from a precompiled template (prompts.Prompt) carry their static
+prefix. OpenAI requests pass the template key as prompt_cache_key, so calls
+that share a prefix land on the same prompt cache. With GEMINI_CONTEXT_CACHE=1
+each prefix is uploaded once as a Gemini context cache
+(GEMINI_CONTEXT_CACHE_TTL_S, default 3600), and only the rest of the prompt is
+sent per call. Gemini only caches contents above a minimum token count. A
+prefix it refuses is logged and sent inline, and caching is retried after the TTL.
+
+Creating a backend does no network I/O and does not import the provider SDK;
+the client is set up on first use. list_models() is the explicit, optional
+model discovery call used by the `list-models` diagnostic command.
+get_backend() wraps the backend in three layers:
+- ResilientBackend adds per-attempt timeouts, retries and a circuit breaker.
+- MeteredBackend records model call latency and errors for /metrics, the
+  model phase of request traces, and token usage (see usage.py).
+- LimitedBackend caps the model calls in flight across the process.
+"""
+
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from admission import ConcurrencyLimiter
+from applog import get_logger
+from metrics import MODEL_ERRORS, MODEL_LATENCY, MODEL_RETRIES
+from resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, is_retryable
+from tracing import phase
+from usage import LEDGER, call_usage, report_usage
+
+log = get_logger('backends')
+
+DEFAULT_MODELS = {
+    'gemini': 'gemini-flash-latest',
+    'openai': 'gpt-4o-mini',
+    'stub': 'stub'
+}
+
+
+def request_timeout(timeout):
+    return {'timeout': timeout} if timeout else None
+
+
+class GeminiBackend:
+    name = 'gemini'
+    # gemini-flash-latest is a thinking model, and its reasoning counts against max_output_tokens
+    output_scale = 8
+
+    def __init__(self, model_name=None, context_cache=None):
+        self.model_name = model_name or DEFAULT_MODELS['gemini']
+        if not os.getenv("GEMINI_API_KEY"):
+            log.warning('Gemini API key not found. Please set GEMINI_API_KEY in .env file')
+        self.context_cache = (context_cache if context_cache is not None
+                              else os.getenv('GEMINI_CONTEXT_CACHE', '0') == '1')
+        self.context_cache_ttl = float(os.getenv('GEMINI_CONTEXT_CACHE_TTL_S', '3600'))
+        self._genai = None
+        self._model = None
+        self._lock = threading.Lock()
+        # prompt prefix -> (model bound to its context cache, or None if caching failed; monotonic expiry)
+        self._cached_models = {}
+        self._cache_lock = threading.Lock()
+
+    @property
+    def genai(self):
+        if self._genai is None:
+            with self._lock:
+                if self._genai is None:
+                    import google.generativeai as genai
+
+                    genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+                    self._genai = genai
+        return self._genai
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = self.genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def list_models(self):
+        return [(m.name, m.supported_generation_methods) for m in self.genai.list_models()]
+
+    def cached_model(self, prefix):
+        with self._cache_lock:
+            model, expires = self._cached_models.get(prefix, (None, 0.0))
+            if time.monotonic() < expires:
+                return model
+            try:
+                cached = self.genai.caching.CachedContent.create(
+                    model=self.model_name, contents=[prefix], ttl=datetime.timedelta(seconds=self.context_cache_ttl))
+                model = self.genai.GenerativeModel.from_cached_content(cached)
+            except Exception as e:
+                log.warning('gemini context cache unavailable', extra={'fields': {
+                    'prefix_chars': len(prefix), 'error': f'{type(e).__name__}: {e}'}})
+                model = None
+            # Recreated a little before Gemini expires it
+            self._cached_models[prefix] = (model, time.monotonic() + self.context_cache_ttl * 0.9)
+            return model
+
+    def model_for(self, prompt):
+        """The model to send `prompt` to and the part of it to send: the whole
+        prompt, or only what follows a prefix held in a context cache."""
+        prefix = getattr(prompt, 'prefix', None)
+        if self.context_cache and prefix:
+            model = self.cached_model(prefix)
+            if model is not None:
+                return model, prompt[len(prefix):]
+        return self.model, prompt
+
+    def generation_config(self, json_schema, limits):
+        config = dict(limits or {})
+        if json_schema is not None:
+            # Gemini's schema subset has no additionalProperties
+            schema = {key: value for key, value in json_schema.items() if key != 'additionalProperties'}
+            config.update(response_mime_type='application/json', response_schema=schema)
+        return config or None
+
+    def report_usage(self, response):
+        metadata = response.usage_metadata
+        if metadata is not None:
+            # finish_reason is an enum; MAX_TOKENS means the reply was cut off
+            truncated = any(getattr(candidate.finish_reason, 'name', '') == 'MAX_TOKENS'
+                            for candidate in response.candidates)
+            # Output includes the thinking tokens: they are billed and count against max_output_tokens
+            output_tokens = (metadata.total_token_count or 0) - (metadata.prompt_token_count or 0)
+            report_usage(metadata.prompt_token_count, output_tokens or metadata.candidates_token_count,
+                         getattr(metadata, 'cached_content_token_count', 0), truncated)
+
+    def generate(self, prompt, json_schema=None, limits=None, timeout=None):
+        model, contents = self.model_for(prompt)
+        response = model.generate_content(contents, generation_config=self.generation_config(json_schema, limits),
+                                          request_options=request_timeout(timeout))
+        self.report_usage(response)
+        return response.text
+
+    async def generate_async(self, prompt, json_schema=None, limits=None, timeout=None):
+        # Creating a context cache blocks; it happens once per prefix and TTL
+        model, contents = self.model_for(prompt)
+        response = await model.generate_content_async(
+            contents, generation_config=self.generation_config(json_schema, limits),
+            request_options=request_timeout(timeout))
+        self.report_usage(response)
+        return response.text
+
+    def stream(self, prompt, limits=None, timeout=None):
+        model, contents = self.model_for(prompt)
+        last = None
+        try:
+            for chunk in model.generate_content(contents, stream=True,
+                                                generation_config=self.generation_config(None, limits),
+                                                request_options=request_timeout(timeout)):
+                # Usage metadata and finish reason are complete on the last chunk
+                last = chunk
+                yield chunk.text
+        finally:
+            # Also when the caller stops reading: the usage so far is still billed
+            if last is not None:
+                self.report_usage(last)
+
+
+class OpenAIBackend:
+    name = 'openai'
+    output_scale = 1
+
+    def __init__(self, model_name=None):
+        self.model_name = model_name or DEFAULT_MODELS['openai']
+        if not os.getenv("OPENAI_API_KEY"):
+            log.warning('OpenAI API key not found. Please set OPENAI_API_KEY in .env file')
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from openai import OpenAI
+
+                    self._client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    from openai import AsyncOpenAI
+
+                    self._async_client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        return self._async_client
+
+    def list_models(self):
+        return [(m.id, ['chat.completions']) for m in self.client.models.list()]
+
+    def request_options(self, prompt, json_schema, limits):
+        options = {'model': self.model_name, 'messages': [{'role': 'user', 'content': prompt}]}
+        if limits:
+            if limits.get('max_output_tokens'):
+                options['max_completion_tokens'] = limits['max_output_tokens']
+            if limits.get('stop_sequences'):
+                # OpenAI takes at most four
+                options['stop'] = limits['stop_sequences'][:4]
+        if getattr(prompt, 'key', None):
+            # Routes calls with the same static prefix to the same prompt cache
+            options['extra_body'] = {'prompt_cache_key': prompt.key}
+        if json_schema is not None:
+            options['response_format'] = {
+                'type': 'json_schema',
+                'json_schema': {'name': 'reply', 'schema': json_schema, 'strict': True}
+            }
+        return options
+
+    def report_usage(self, usage, finish_reason):
+        if usage is not None:
+            details = getattr(usage, 'prompt_tokens_details', None)
+            report_usage(usage.prompt_tokens, usage.completion_tokens, getattr(details, 'cached_tokens', 0),
+                         finish_reason == 'length')
+
+    def generate(self, prompt, json_schema=None, limits=None, timeout=None):
+        response = self.client.chat.completions.create(
+            **self.request_options(prompt, json_schema, limits), timeout=timeout)
+        self.report_usage(response.usage, response.choices[0].finish_reason)
+        return response.choices[0].message.content
+
+    async def generate_async(self, prompt, json_schema=None, limits=None, timeout=None):
+        response = await self.async_client.chat.completions.create(
+            **self.request_options(prompt, json_schema, limits), timeout=timeout)
+        self.report_usage(response.usage, response.choices[0].finish_reason)
+        return response.choices[0].message.content
+
+    def stream(self, prompt, limits=None, timeout=None):
+        events = self.client.chat.completions.create(**self.request_options(prompt, None, limits), stream=True,
+                                                     stream_options={'include_usage': True}, timeout=timeout)
+        finish_reason = None
+        for event in events:
+            # The last event has no choices, only the usage of the whole call
+            if event.usage is not None:
+                self.report_usage(event.usage, finish_reason)
+            if event.choices:
+                finish_reason = event.choices[0].finish_reason or finish_reason
+                if event.choices[0].delta.content:
+                    yield event.choices[0].delta.content
+
+
+class StubUnavailableError(Exception):
+    # Stands in for a provider 503
+    status_code = 503
+
+
+class StubBackend:
+    """Deterministic offline backend. The reply depends only on the prompt, and
+    every call sleeps for `latency` seconds to stand in for the model round trip.
+
+    Faults can be injected for testing the retry and circuit breaker paths:
+    `error_rate` of calls raise StubUnavailableError (STUB_ERROR_RATE) and
+    `hang_rate` of calls hang until their timeout (STUB_HANG_RATE), or for
+    STUB_HANG_MS when no timeout is given."""
+    name = 'stub'
+    output_scale = 1
+
+    def __init__(self, model_name=None, latency=None, error_rate=None, hang_rate=None):
+        self.model_name = model_name or DEFAULT_MODELS['stub']
+        if latency is None:
+            latency = float(os.getenv('STUB_LATENCY_MS', '0')) / 1000
+        self.latency = latency
+        self.error_rate = error_rate if error_rate is not None else float(os.getenv('STUB_ERROR_RATE', '0'))
+        self.hang_rate = hang_rate if hang_rate is not None else float(os.getenv('STUB_HANG_RATE', '0'))
+        self.hang = float(os.getenv('STUB_HANG_MS', '60000')) / 1000
+
+    def fault(self, timeout):
+        """Pick this call's fault: None, or (seconds to wait, exception to raise after waiting)."""
+        roll = random.random()
+        if roll < self.error_rate:
+            return self.latency, StubUnavailableError('stub backend: injected 503')
+        if roll < self.error_rate + self.hang_rate:
+            if timeout:
+                return timeout, TimeoutError(f'stub backend: no reply within {timeout:.1f}s')
+            return self.hang, None
+        return None
+
+    def list_models(self):
+        return [(self.model_name, ['generate', 'stream'])]
+
+    def translation_fields(self, phrase):
+        digest = hashlib.sha1(phrase.encode('utf-8')).hexdigest()[:8]
+        return {
+            'translation': f"[{digest}] {phrase}",
+            'context': f"Stub context for: {phrase}",
+            'responses': "1. Yes (Yes)\n2. No (No)\n3. I am not sure (I am not sure)"
+        }
+
+    def translation(self, phrase):
+        fields = self.translation_fields(phrase)
+        return (f"TRANSLATION:\n{fields['translation']}\n\n"
+                f"CONTEXT:\n{fields['context']}\n\n"
+                f"RESPONSES:\n{fields['responses']}")
+
+    def phrase(self, prompt):
+        # The user text is the last quoted string; prompts put it at the end
+        quoted = re.findall(r'"(.*)"', prompt)
+        return quoted[-1] if quoted else ''
+
+    def reply(self, prompt, json_schema=None):
+        if json_schema is not None:
+            return json.dumps(self.translation_fields(self.phrase(prompt)), ensure_ascii=False)
+        if '=== ITEM <number> ===' in prompt:
+            # Batch prompt: phrases are listed as numbered JSON strings
+            items = re.findall(r'^(\d+)\. (".*")$', prompt, re.MULTILINE)
+            return '\n\n'.join(f"=== ITEM {number} ===\n{self.translation(json.loads(phrase))}"
+                                 for number, phrase in items)
+        phrase = self.phrase(prompt)
+        if 'TRANSLATION:' not in prompt:
+            digest = hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:8]
+            return (f"**Advice [{digest}]** for: {phrase}\n\n"
+                    "1. See a primary care doctor.\n"
+                    "2. Call ahead for an appointment.\n"
+                    "3. Expect a short examination.\n"
+                    "4. Bring your insurance card and ID.\n"
+                    "5. Ask the front desk about costs.")
+        return self.translation(phrase)
+
+    def limited_reply(self, prompt, json_schema, limits):
+        """The reply cut at the first stop sequence and at max_output_tokens,
+        and whether it was truncated. No tokenizer offline; a token is about four characters."""
+        reply = self.reply(prompt, json_schema)
+        limits = limits or {}
+        for stop in limits.get('stop_sequences') or ():
+            reply = reply.split(stop, 1)[0]
+        max_chars = (limits.get('max_output_tokens') or 0) * 4
+        truncated = bool(max_chars) and len(reply) > max_chars
+        if truncated:
+            reply = reply[:max_chars]
+        report_usage(len(prompt) // 4 + 1, len(reply) // 4 + 1, 0, truncated)
+        return reply
+
+    def generate(self, prompt, json_schema=None, limits=None, timeout=None):
+        fault = self.fault(timeout)
+        time.sleep(fault[0] if fault else self.latency)
+        if fault and fault[1]:
+            raise fault[1]
+        return self.limited_reply(prompt, json_schema, limits)
+
+    async def generate_async(self, prompt, json_schema=None, limits=None, timeout=None):
+        fault = self.fault(timeout)
+        await asyncio.sleep(fault[0] if fault else self.latency)
+        if fault and fault[1]:
+            raise fault[1]
+        return self.limited_reply(prompt, json_schema, limits)
+
+    def stream(self, prompt, limits=None, timeout=None, chunks=4):
+        fault = self.fault(timeout)
+        if fault:
+            time.sleep(fault[0])
+            if fault[1]:
+                raise fault[1]
+        reply = self.limited_reply(prompt, None, limits)
+        size = len(reply) // chunks + 1
+        for i in range(0, len(reply), size):
+            time.sleep(self.latency / chunks)
+            yield reply[i:i + size]
+
+
+class ResilientBackend:
+    """Wraps a backend with per-attempt timeouts, jittered retries and a
+    circuit breaker (see resilience.py)."""
+
+    def __init__(self, inner, policy=None, breaker=None):
+        self.inner = inner
+        self.policy = policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def record_error(self, error):
+        # Only upstream trouble counts toward the breaker. A client-side error (a 400, a blocked or
+        # empty reply) means the upstream answered, so one client's bad input cannot open it.
+        if is_retryable(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def failed(self, call, attempt, error, backoff):
+        """Record a failed attempt. Returns True if it should be retried after `backoff`."""
+        self.record_error(error)
+        if backoff is None or not is_retryable(error):
+            return False
+        MODEL_RETRIES.inc(self.inner.name, call)
+        log.warning('model call retry', extra={'fields': {
+            'backend': self.inner.name, 'call': call, 'attempt': attempt + 1,
+            'error': f'{type(error).__name__}: {error}', 'backoff_ms': round(backoff * 1000)}})
+        return True
+
+    def generate(self, prompt, json_schema=None, limits=None):
+        for attempt, timeout, backoff in self.policy.attempts():
+            self.breaker.before_call()
+            try:
+                result = self.inner.generate(prompt, json_schema=json_schema, limits=limits, timeout=timeout)
+            except Exception as e:
+                if not self.failed('generate', attempt, e, backoff):
+                    raise
+                time.sleep(backoff)
+            else:
+                self.breaker.record_success()
+                return result
+        raise TimeoutError(f'model call deadline of {self.policy.deadline:.0f}s exceeded')
+
+    async def generate_async(self, prompt, json_schema=None, limits=None):
+        for attempt, timeout, backoff in self.policy.attempts():
+            self.breaker.before_call()
+            try:
+                result = await self.inner.generate_async(prompt, json_schema=json_schema, limits=limits,
+                                                         timeout=timeout)
+            except Exception as e:
+                if not self.failed('generate_async', attempt, e, backoff):
+                    raise
+                await asyncio.sleep(backoff)
+            else:
+                self.breaker.record_success()
+                return result
+        raise TimeoutError(f'model call deadline of {self.policy.deadline:.0f}s exceeded')
+
+    def stream(self, prompt, limits=None):
+        # Only retried before the first chunk; after that the client already has part of the reply
+        for attempt, timeout, backoff in self.policy.attempts():
+            self.breaker.before_call()
+            started = False
+            try:
+                for chunk in self.inner.stream(prompt, limits=limits, timeout=timeout):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if started:
+                    self.record_error(e)
+                    raise
+                if not self.failed('stream', attempt, e, backoff):
+                    raise
+                time.sleep(backoff)
+            else:
+                self.breaker.record_success()
+                return
+        raise TimeoutError(f'model call deadline of {self.policy.deadline:.0f}s exceeded')
+
+
+class MeteredBackend:
+    """Wraps a backend and records model call latency and errors in metrics,
+    and as the `model` phase of the current request trace. Successful calls
+    are added to the usage ledger with the token counts the backend reported."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    @contextmanager
+    def metered(self, call, prompt):
+        call_usage.set(None)
+        start = time.perf_counter()
+        try:
+            with phase('model', backend=self.inner.name, model=self.inner.model_name, call=call):
+                yield
+        except CircuitOpenError:
+            # Rejected without calling the model; counted by the breaker, not as model latency
+            raise
+        except GeneratorExit:
+            # The caller stopped reading a stream; the tokens generated so far are still billed
+            LEDGER.record(self.inner.name, self.inner.model_name, prompt, time.perf_counter() - start,
+                          call_usage.get())
+            raise
+        except Exception:
+            MODEL_ERRORS.inc(self.inner.name, call)
+            MODEL_LATENCY.observe(time.perf_counter() - start, self.inner.name, call)
+            raise
+        elapsed = time.perf_counter() - start
+        MODEL_LATENCY.observe(elapsed, self.inner.name, call)
+        LEDGER.record(self.inner.name, self.inner.model_name, prompt, elapsed, call_usage.get())
+
+    def generate(self, prompt, json_schema=None, limits=None):
+        with self.metered('generate', prompt):
+            return self.inner.generate(prompt, json_schema=json_schema, limits=limits)
+
+    async def generate_async(self, prompt, json_schema=None, limits=None):
+        with self.metered('generate_async', prompt):
+            return await self.inner.generate_async(prompt, json_schema=json_schema, limits=limits)
+
+    def stream(self, prompt, limits=None):
+        # Measured to the last chunk; time spent by the caller between chunks is included
+        with self.metered('stream', prompt):
+            yield from self.inner.stream(prompt, limits=limits)
+
+
+class LimitedBackend:
+    """Wraps a backend so that at most `limiter.limit` model calls are in flight
+    (see admission.py). Time spent waiting for a slot is the `queue` phase."""
+
+    def __init__(self, inner, limiter=None):
+        self.inner = inner
+        self.limiter = limiter or ConcurrencyLimiter()
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def generate(self, prompt, json_schema=None, limits=None):
+        with phase('queue'):
+            self.limiter.acquire()
+        try:
+            return self.inner.generate(prompt, json_schema=json_schema, limits=limits)
+        finally:
+            self.limiter.release()
+
+    async def generate_async(self, prompt, json_schema=None, limits=None):
+        with phase('queue'):
+            await self.limiter.acquire_async()
+        try:
+            return await self.inner.generate_async(prompt, json_schema=json_schema, limits=limits)
+        finally:
+            self.limiter.release()
+
+    def stream(self, prompt, limits=None):
+        with phase('queue'):
+            self.limiter.acquire()
+        try:
+            yield from self.inner.stream(prompt, limits=limits)
+        finally:
+            self.limiter.release()
+
+
+BACKENDS = {
+    'gemini': GeminiBackend,
+    'openai': OpenAIBackend,
+    'stub': StubBackend
+}
+
+
+def get_backend(name=None, model_name=None):
+    name = name or os.getenv('TRANSLATOR_BACKEND', 'gemini')
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}', expected one of: {', '.join(BACKENDS)}")
+    backend = BACKENDS[name](model_name or os.getenv('TRANSLATOR_MODEL'))
+    return LimitedBackend(MeteredBackend(ResilientBackend(backend)))
@@ -0,0 +1,261 @@
+"""
+Load test for the /api/translate and /api/advice endpoints.
+
+By default the app is started in-process on a free port with the stub model
+backend, so no API key is needed and the numbers measure server overhead and
+concurrency only. Requests cycle through both translate directions for every
+language in LANGUAGE_CONFIG, plus advice for every language.
+
+Usage (from the repository root):
+    python -m benchmarks.load_test --concurrency 16 --requests 960 --latency-ms 200
+    python -m benchmarks.load_test --output baseline.json
+    python -m benchmarks.load_test --compare baseline.json
+    python -m benchmarks.load_test --server asgi --concurrency 256   # asyncio serving path (asgi.py)
+    python -m benchmarks.load_test --url http://localhost:5001   # an already running server
+    python -m benchmarks.load_test --error-rate 0.2 --hang-rate 0.05   # inject stub faults
+
+The response cache and phrasebook are disabled for in-process runs unless
+--cache is given, so every request reaches the (stub) model. Rate limiting and
+the model concurrency cap are disabled too, since every request comes from one
+client, unless --admission is given.
+
+The Server-Timing phases reported by the server (decode, prompt, model, parse,
+...) are summarized per scenario as well. `server_overhead` is the total minus
+the model phase, which separates our latency from upstream latency.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ADVICE_SYMPTOMS = ['I have a fever', 'My stomach hurts', 'I have a headache', 'I have a cough']
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, int(round(pct / 100 * len(sorted_values))) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def parse_server_timing(header):
+    """{'model': 812.3, ...} from a Server-Timing header value."""
+    phases = {}
+    for metric in (header or '').split(','):
+        name, _, params = metric.strip().partition(';')
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'dur' and name:
+                phases[name] = phases.get(name, 0.0) + float(value)
+    if 'total' in phases:
+        phases['server_overhead'] = round(phases['total'] - phases.get('model', 0.0), 2)
+    return phases
+
+
+def summarize_phases(samples):
+    by_phase = {}
+    for _, _, phases in samples:
+        for name, ms in phases.items():
+            by_phase.setdefault(name, []).append(ms)
+    return {name: {'p50': percentile(sorted(values), 50), 'p99': percentile(sorted(values), 99)}
+            for name, values in sorted(by_phase.items())}
+
+
+def summarize(samples, duration):
+    latencies = sorted(ms for ms, ok, _ in samples)
+    errors = sum(1 for ms, ok, _ in samples if not ok)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': errors / len(samples) if samples else 0.0,
+        'throughput_rps': len(samples) / duration if duration else 0.0,
+        'latency_ms': {
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'mean': sum(latencies) / len(latencies) if latencies else 0.0,
+            'max': latencies[-1] if latencies else 0.0
+        },
+        'server_timing_ms': summarize_phases(samples)
+    }
+
+
+def build_workload(language_config, hospital_questions):
+    """One (name, path, payload) per scenario; the load test cycles through them."""
+    scenarios = []
+    for lang, config in language_config.items():
+        for text in hospital_questions:
+            scenarios.append((f'translate:{lang}:hospital_to_patient', '/api/translate',
+                              {'text': text, 'language': lang, 'direction': 'hospital_to_patient'}))
+        for text in config['patient_quick_questions']:
+            scenarios.append((f'translate:{lang}:patient_to_hospital', '/api/translate',
+                              {'text': text, 'language': lang, 'direction': 'patient_to_hospital'}))
+        for symptom in ADVICE_SYMPTOMS:
+            scenarios.append((f'advice:{lang}', '/api/advice', {'symptom': symptom, 'language': lang}))
+    return scenarios
+
+
+def send(base_url, path, payload, timeout, headers=None):
+    body = json.dumps(payload).encode('utf-8')
+    req = urllib.request.Request(base_url + path, data=body,
+                                 headers={'Content-Type': 'application/json', **(headers or {})})
+    start = time.perf_counter()
+    phases = {}
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+            ok = response.status == 200
+            phases = parse_server_timing(response.headers.get('Server-Timing'))
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return (time.perf_counter() - start) * 1000, ok, phases
+
+
+def run(base_url, scenarios, total, concurrency, timeout):
+    by_name = {}
+    lock = threading.Lock()
+
+    def task(i):
+        name, path, payload = scenarios[i % len(scenarios)]
+        sample = send(base_url, path, payload, timeout)
+        with lock:
+            by_name.setdefault(name, []).append(sample)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(task, range(total)))
+    duration = time.perf_counter() - start
+
+    all_samples = [s for samples in by_name.values() for s in samples]
+    return {
+        'overall': summarize(all_samples, duration),
+        'endpoints': {name: summarize(samples, duration) for name, samples in sorted(by_name.items())}
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_asgi_server(port):
+    import uvicorn
+
+    config = uvicorn.Config('asgi:app', host='127.0.0.1', port=port, log_level='warning', backlog=4096)
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def start_local_server(latency_ms, use_cache, mode, error_rate=0.0, hang_rate=0.0, admission=False):
+    # Configure the app before importing it; backend and cache are created at import time
+    os.environ['TRANSLATOR_BACKEND'] = 'stub'
+    os.environ['STUB_LATENCY_MS'] = str(latency_ms)
+    os.environ['STUB_ERROR_RATE'] = str(error_rate)
+    os.environ['STUB_HANG_RATE'] = str(hang_rate)
+    # Stub token counts do not belong in the usage rollup
+    os.environ.setdefault('USAGE_DIR', '')
+    if not use_cache:
+        os.environ['TRANSLATION_CACHE_SIZE'] = '0'
+        os.environ['PHRASEBOOK_PATH'] = ''
+        os.environ['SEMANTIC_CACHE_SIZE'] = '0'
+    if not admission:
+        os.environ['RATE_LIMIT_RPS'] = '0'
+        os.environ['MAX_INFLIGHT_MODEL_CALLS'] = '0'
+    from werkzeug.serving import make_server
+    import app as app_module
+
+    if mode == 'asgi':
+        port = free_port()
+        return start_asgi_server(port), port, app_module
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_port, app_module
+
+
+def compare(report, baseline):
+    print(f"{'scenario':40} {'p50 ms':>16} {'p99 ms':>16} {'rps':>16}")
+    rows = [('overall', report['overall'], baseline['overall'])]
+    rows += [(name, stats, baseline['endpoints'][name])
+             for name, stats in report['endpoints'].items() if name in baseline['endpoints']]
+    for name, new, old in rows:
+        cells = []
+        for value, before in [(new['latency_ms']['p50'], old['latency_ms']['p50']),
+                              (new['latency_ms']['p99'], old['latency_ms']['p99']),
+                              (new['throughput_rps'], old['throughput_rps'])]:
+            change = (value - before) / before * 100 if before else 0.0
+            cells.append(f"{value:8.1f} ({change:+5.1f}%)")
+        print(f"{name:40} {cells[0]:>16} {cells[1]:>16} {cells[2]:>16}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', help='base URL of a running server (default: start one in-process)')
+    parser.add_argument('--requests', type=int, default=480, help='total number of requests')
+    parser.add_argument('--concurrency', type=int, default=16, help='requests in flight at once')
+    parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi',
+                        help='in-process server: threaded Flask (wsgi) or asgi.py under uvicorn (asgi)')
+    parser.add_argument('--latency-ms', type=float, default=200, help='stub model latency for in-process runs')
+    parser.add_argument('--timeout', type=float, default=30, help='per-request client timeout in seconds')
+    parser.add_argument('--cache', action='store_true', help='keep the response cache and phrasebook enabled')
+    parser.add_argument('--admission', action='store_true',
+                        help='keep the per-client rate limit and model concurrency cap enabled')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of stub model calls that fail (503)')
+    parser.add_argument('--hang-rate', type=float, default=0.0,
+                        help='fraction of stub model calls that hang until MODEL_TIMEOUT_S')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--compare', help='baseline JSON report to compare against')
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+        from app import HOSPITAL_QUICK_QUESTIONS, LANGUAGE_CONFIG
+    else:
+        server, port, app_module = start_local_server(args.latency_ms, args.cache, args.server,
+                                                      args.error_rate, args.hang_rate, args.admission)
+        base_url = f'http://127.0.0.1:{port}'
+        HOSPITAL_QUICK_QUESTIONS, LANGUAGE_CONFIG = app_module.HOSPITAL_QUICK_QUESTIONS, app_module.LANGUAGE_CONFIG
+
+    scenarios = build_workload(LANGUAGE_CONFIG, HOSPITAL_QUICK_QUESTIONS)
+    report = run(base_url, scenarios, args.requests, args.concurrency, args.timeout)
+    report['config'] = {
+        'url': args.url,
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'server': None if args.url else args.server,
+        'stub_latency_ms': None if args.url else args.latency_ms,
+        'cache': args.cache,
+        'admission': args.admission,
+        'stub_error_rate': None if args.url else args.error_rate,
+        'stub_hang_rate': None if args.url else args.hang_rate
+    }
+    if server is not None and args.server == 'asgi':
+        server.should_exit = True
+    elif server is not None:
+        server.shutdown()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report, json.load(f))
+    elif not args.output:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Micro-benchmark for request-path logging.
+
+Measures the cost per call, on the calling thread, of:
+  - print() of a raw model reply block (what app.py used to do),
+  - a queued INFO record with structured fields (applog),
+  - a DEBUG record filtered out by level,
+  - sample_response() at the default sample rate.
+Output goes to /dev/null so only the logging overhead is timed, not the terminal.
+
+Usage (from the repository root):
+    python -m benchmarks.logging_bench
+    python -m benchmarks.logging_bench --calls 50000
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+
+from applog import get_logger, sample_response, setup_logging, stop_logging
+
+REPLY = ('TRANSLATION:\n请告诉我您的出生日期。\n\nCONTEXT:\n护士需要核对您的身份。\n\n'
+         'RESPONSES:\n1. 我的出生日期是1980年1月1日。(My date of birth is January 1, 1980.)\n') * 3
+
+
+def time_calls(fn, calls):
+    """Median time per call in microseconds over 5 samples."""
+    samples = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        samples.append((time.perf_counter() - start) / calls * 1e6)
+    return statistics.median(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--calls', type=int, default=20000, help='calls per timing sample')
+    args = parser.parse_args(argv)
+
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        setup_logging(stream=devnull, level='INFO', fmt='json')
+        log = get_logger('bench')
+
+        def print_reply():
+            with contextlib.redirect_stdout(devnull):
+                print("=" * 50)
+                print("GEMINI RESPONSE (chinese):")
+                print(REPLY)
+                print("=" * 50)
+
+        def log_info():
+            log.info('translate', extra={'fields': {'language': 'chinese', 'direction': 'to_patient',
+                                                    'text': 'What is your date of birth?'}})
+
+        def log_filtered():
+            log.debug('model call', extra={'fields': {'language': 'chinese'}})
+
+        def log_sampled_reply():
+            if sample_response():
+                log.info('model reply', extra={'fields': {'language': 'chinese', 'reply': REPLY}})
+
+        report = {
+            'calls': args.calls,
+            'print_reply_us': time_calls(print_reply, args.calls),
+            'queued_info_us': time_calls(log_info, args.calls),
+            'filtered_debug_us': time_calls(log_filtered, args.calls),
+            'sampled_reply_us': time_calls(log_sampled_reply, args.calls)
+        }
+        stop_logging()
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Micro-benchmark for the /metrics instrumentation.
+
+Times Counter.inc and Histogram.observe from metrics.py against the same
+operations guarded by a single shared threading.Lock. Each is run from 1 to
+--threads threads. Reports nanoseconds per operation (wall time / total ops).
+
+Usage (from the repository root):
+    python -m benchmarks.metrics_bench
+    python -m benchmarks.metrics_bench --threads 16 --ops 200000
+"""
+
+import argparse
+import bisect
+import json
+import sys
+import threading
+import time
+
+from metrics import LATENCY_BUCKETS, Counter, Histogram, Registry
+
+
+class LockedCounter:
+    # The usual alternative: one dict shared by every thread behind one lock
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labelvalues):
+        with self.lock:
+            self.values[labelvalues] = self.values.get(labelvalues, 0) + 1
+
+    def observe(self, value, *labelvalues):
+        with self.lock:
+            counts = self.values.setdefault(labelvalues, [0] * (len(LATENCY_BUCKETS) + 3))
+            counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+
+def run(op, threads, ops):
+    per_thread = ops // threads
+
+    def work():
+        for _ in range(per_thread):
+            op()
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) / (per_thread * threads) * 1e9
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--ops', type=int, default=100000, help='operations per run, split across threads')
+    args = parser.parse_args(argv)
+
+    registry = Registry()
+    counter = Counter('bench_total', 'bench', ('endpoint', 'language'), registry=registry)
+    histogram = Histogram('bench_seconds', 'bench', ('endpoint', 'language'), registry=registry)
+    locked_counter = LockedCounter()
+    locked_histogram = LockedCounter()
+    ops = {
+        'sharded_inc': lambda: counter.inc('translate', 'chinese'),
+        'locked_inc': lambda: locked_counter.inc('translate', 'chinese'),
+        'sharded_observe': lambda: histogram.observe(0.12, 'translate', 'chinese'),
+        'locked_observe': lambda: locked_histogram.observe(0.12, 'translate', 'chinese')
+    }
+
+    report = {'ops': args.ops, 'ns_per_op': {}}
+    thread_counts = sorted({1, 2, 4, args.threads})
+    for name, op in ops.items():
+        report['ns_per_op'][name] = {threads: round(run(op, threads, args.ops)) for threads in thread_counts}
+    start = time.perf_counter()
+    registry.render()
+    report['render_ms'] = (time.perf_counter() - start) * 1e3
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Overload test: one misbehaving client next to several well-behaved ones.
+
+The noisy client sends /api/translate requests back to back from --noisy-concurrency
+threads under one API key. Each polite client sends one request every
+--polite-interval seconds under its own key. Everything runs against an
+in-process server with the stub model backend. The report gives latency and
+status counts for each group.
+
+Run it once with the defaults (admission control on) and once with
+--no-admission to see what the rate limit and concurrency cap buy the polite
+clients.
+
+Usage (from the repository root):
+    python -m benchmarks.overload
+    python -m benchmarks.overload --no-admission
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.load_test import percentile, start_local_server
+
+
+def post(base_url, text, api_key, timeout):
+    body = json.dumps({'text': text, 'language': 'chinese'}).encode('utf-8')
+    req = urllib.request.Request(base_url + '/api/translate', data=body,
+                                 headers={'Content-Type': 'application/json', 'X-API-Key': api_key})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        status = 0
+    return (time.perf_counter() - start) * 1000, status
+
+
+def summarize(samples):
+    ok = sorted(ms for ms, status in samples if status == 200)
+    statuses = {}
+    for _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(samples),
+        'statuses': statuses,
+        'ok_latency_ms': {'p50': percentile(ok, 50), 'p99': percentile(ok, 99), 'max': ok[-1] if ok else 0.0}
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--duration', type=float, default=10, help='seconds to run')
+    parser.add_argument('--latency-ms', type=float, default=100, help='stub model latency')
+    parser.add_argument('--noisy-concurrency', type=int, default=64)
+    parser.add_argument('--polite-clients', type=int, default=4)
+    parser.add_argument('--polite-interval', type=float, default=0.5, help='seconds between polite requests')
+    parser.add_argument('--no-admission', action='store_true', help='disable rate limiting and the concurrency cap')
+    args = parser.parse_args(argv)
+
+    # Each client is told apart by its API key
+    os.environ.setdefault('API_KEYS', ','.join(['noisy-kiosk'] + [f'clinic-{n}' for n in range(args.polite_clients)]))
+    # A small cap makes the overload visible with the stub backend
+    os.environ.setdefault('MAX_INFLIGHT_MODEL_CALLS', '16')
+    os.environ.setdefault('MODEL_QUEUE_SIZE', '16')
+    os.environ.setdefault('MODEL_QUEUE_TIMEOUT_S', '1')
+    server, port, _ = start_local_server(args.latency_ms, False, 'wsgi', admission=not args.no_admission)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + args.duration
+    samples = {'noisy': [], 'polite': []}
+    lock = threading.Lock()
+
+    def noisy(worker):
+        i = 0
+        while time.monotonic() < deadline:
+            sample = post(base_url, f'noisy {worker} {i}', 'noisy-kiosk', 30)
+            with lock:
+                samples['noisy'].append(sample)
+            i += 1
+
+    def polite(client):
+        i = 0
+        while time.monotonic() < deadline:
+            sample = post(base_url, f'polite {client} {i}', f'clinic-{client}', 30)
+            with lock:
+                samples['polite'].append(sample)
+            i += 1
+            time.sleep(args.polite_interval)
+
+    threads = [threading.Thread(target=noisy, args=(n,)) for n in range(args.noisy_concurrency)]
+    threads += [threading.Thread(target=polite, args=(n,)) for n in range(args.polite_clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+
+    report = {
+        'config': {**vars(args), 'admission': not args.no_admission},
+        'noisy': summarize(samples['noisy']),
+        'polite': summarize(samples['polite'])
+    }
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Micro-benchmark for the TRANSLATION/CONTEXT/RESPONSES reply parser.
+
+Runs every reply in a corpus (default: benchmarks/data/replies.jsonl, one
+JSON object with a "reply" field per line) through the legacy split-based
+parser, response_parser.parse_reply and response_parser.IncrementalParser fed
+in 32-character chunks. A synthetic worst case is included as well: the
+longest corpus reply padded to 4 KB. Reports per-reply time in microseconds
+and how many replies each parser could parse.
+
+Usage (from the repository root):
+    python -m benchmarks.parser_bench
+    python -m benchmarks.parser_bench --corpus recorded.jsonl --repeat 5000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from response_parser import IncrementalParser, ParseError, parse_reply
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), 'data', 'replies.jsonl')
+WORST_CASE_BYTES = 4096
+CHUNK_SIZE = 32
+
+
+def legacy_parse(content):
+    # The split-based parser app.py used before response_parser
+    parts = content.split('TRANSLATION:')[1].split('CONTEXT:')
+    parts2 = parts[1].split('RESPONSES:')
+    return {'translation': parts[0].strip(), 'context': parts2[0].strip(), 'responses': parts2[1].strip()}
+
+
+def incremental_parse(content):
+    parser = IncrementalParser()
+    for i in range(0, len(content), CHUNK_SIZE):
+        parser.feed(content[i:i + CHUNK_SIZE])
+    parser.close()
+    return parser.result()
+
+
+PARSERS = {
+    'legacy_split': legacy_parse,
+    'parse_reply': parse_reply,
+    'incremental': incremental_parse
+}
+
+
+def load_corpus(path):
+    with open(path, encoding='utf-8') as f:
+        replies = [json.loads(line)['reply'] for line in f if line.strip()]
+    # Worst case: the longest reply with its RESPONSES section padded to 4 KB
+    longest = max(replies, key=lambda r: len(r.encode('utf-8')))
+    padding = '\n4. I would like to speak to an interpreter, please. (Interpreter request)'
+    worst = longest
+    while len(worst.encode('utf-8')) < WORST_CASE_BYTES:
+        worst += padding
+    return replies, worst
+
+
+def time_parser(parse, content, repeat):
+    """Median time per call in microseconds, or None if the parser fails on this reply."""
+    try:
+        parse(content)
+    except (ParseError, IndexError, AttributeError):
+        return None
+    samples = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            parse(content)
+        samples.append((time.perf_counter() - start) / repeat * 1e6)
+    return statistics.median(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS)
+    parser.add_argument('--repeat', type=int, default=2000, help='calls per timing sample')
+    args = parser.parse_args(argv)
+
+    replies, worst = load_corpus(args.corpus)
+    report = {'corpus': args.corpus, 'replies': len(replies), 'worst_case_bytes': len(worst.encode('utf-8'))}
+    for name, parse in PARSERS.items():
+        timings = [time_parser(parse, reply, args.repeat) for reply in replies]
+        parsed = [t for t in timings if t is not None]
+        report[name] = {
+            'parsed': len(parsed),
+            'median_us': statistics.median(parsed) if parsed else None,
+            'max_us': max(parsed) if parsed else None,
+            'worst_case_4kb_us': time_parser(parse, worst, args.repeat)
+        }
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
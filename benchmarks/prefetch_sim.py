@@ -0,0 +1,82 @@
+"""
+Simulated realtime sessions with speculative prefetch of suggested replies.
+
+Each session is one hospital question through /api/translate/stream,
+followed --think-ms later by the patient's reply through the same endpoint.
+With probability --tap-rate the patient taps one of the suggested replies;
+otherwise they type something of their own. Everything runs in-process with
+the stub model backend and prefetch enabled (add --no-prefetch to compare).
+
+The report gives the patient reply latency and the prefetch counters from
+/api/cache/stats, including the hit rate.
+
+Usage (from the repository root):
+    python -m benchmarks.prefetch_sim
+    python -m benchmarks.prefetch_sim --no-prefetch
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from benchmarks.load_test import percentile
+
+
+def read_events(body):
+    events = {}
+    for block in body.split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line)
+        if 'event' in lines:
+            events[lines['event']] = json.loads(lines['data'])
+    return events
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sessions', type=int, default=60)
+    parser.add_argument('--latency-ms', type=float, default=200, help='stub model latency')
+    parser.add_argument('--think-ms', type=float, default=1500, help='time before the patient replies')
+    parser.add_argument('--tap-rate', type=float, default=0.7, help='share of replies that are a suggestion')
+    parser.add_argument('--no-prefetch', action='store_true')
+    args = parser.parse_args(argv)
+
+    os.environ['TRANSLATOR_BACKEND'] = 'stub'
+    os.environ['STUB_LATENCY_MS'] = str(args.latency_ms)
+    os.environ['PREFETCH_RESPONSES'] = '0' if args.no_prefetch else '1'
+    os.environ['PREFETCH_RATE'] = '100'
+    os.environ['RATE_LIMIT_RPS'] = '0'
+    os.environ.setdefault('USAGE_DIR', '')
+    import app as app_module
+
+    client = app_module.app.test_client()
+    rng = random.Random(0)
+    languages = list(app_module.LANGUAGE_CONFIG)
+    replies = []
+    for n in range(args.sessions):
+        lang = rng.choice(languages)
+        question = f'{rng.choice(app_module.HOSPITAL_QUICK_QUESTIONS)} ({n})'
+        events = read_events(client.post('/api/translate/stream', json={
+            'text': question, 'language': lang, 'direction': 'hospital_to_patient'}).get_data(as_text=True))
+        time.sleep(args.think_ms / 1000)
+        suggestions = events.get('suggestions', {}).get('texts', [])
+        reply = rng.choice(suggestions) if suggestions and rng.random() < args.tap_rate else f'something else {n}'
+        start = time.perf_counter()
+        client.post('/api/translate/stream', json={'text': reply, 'language': lang,
+                                                   'direction': 'patient_to_hospital'}).get_data()
+        replies.append((time.perf_counter() - start) * 1000)
+
+    replies.sort()
+    report = {
+        'config': vars(args),
+        'reply_latency_ms': {'p50': percentile(replies, 50), 'p90': percentile(replies, 90)},
+        'prefetch': client.get('/api/cache/stats').get_json()['prefetch']
+    }
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""
+Micro-benchmark for prompt construction.
+
+Compares building each prompt from scratch with the f-string builders in app.py
+against rendering the templates precompiled at startup (prompts.py). Reports
+nanoseconds per prompt for each kind, and each prefix's length: the part of
+the prompt that is identical across calls and can be cached by the provider.
+
+Usage (from the repository root):
+    python -m benchmarks.prompt_bench
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+os.environ.setdefault('TRANSLATOR_BACKEND', 'stub')
+
+from app import (LANGUAGE_CONFIG, PROMPTS, batch_items, build_advice_prompt, build_batch_translate_prompt,
+                 build_translate_prompt)
+
+TEXT = 'When did the symptoms start?'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--number', type=int, default=100000, help='prompts per timing')
+    args = parser.parse_args(argv)
+
+    config = LANGUAGE_CONFIG['urdu']
+    items = batch_items([TEXT] * 10)
+    cases = {
+        'sections': (lambda: build_translate_prompt(TEXT, config, 'hospital_to_patient'),
+                     PROMPTS['urdu', 'hospital_to_patient', 'sections'], TEXT),
+        'json': (lambda: build_translate_prompt(TEXT, config, 'hospital_to_patient', 'json'),
+                 PROMPTS['urdu', 'hospital_to_patient', 'json'], TEXT),
+        'batch': (lambda: build_batch_translate_prompt(items, config, 'hospital_to_patient'),
+                  PROMPTS['urdu', 'hospital_to_patient', 'batch'], items),
+        'advice': (lambda: build_advice_prompt(TEXT, config), PROMPTS['urdu', None, 'advice'], TEXT)
+    }
+
+    report = {'number': args.number, 'ns_per_prompt': {}, 'prefix_chars': {}}
+    for kind, (build, template, text) in cases.items():
+        assert build() == template.render(text)
+        report['ns_per_prompt'][kind] = {
+            'build': round(min(timeit.repeat(build, number=args.number, repeat=3)) / args.number * 1e9),
+            'render': round(min(timeit.repeat(lambda: template.render(text), number=args.number, repeat=3))
+                            / args.number * 1e9)
+        }
+        report['prefix_chars'][kind] = len(template.prefix)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
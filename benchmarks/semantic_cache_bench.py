@@ -0,0 +1,115 @@
+"""
+Hit rate, false-hit rate and lookup latency of the semantic cache.
+
+Quality: each labelled pair in the corpus (default
+benchmarks/data/semantic_pairs.jsonl) has a `cached` phrase, a `query` phrase
+and a `same` flag saying whether a patient would want the same translation
+for both. Every cached phrase goes into one index per language. Then every
+query is looked up at each threshold:
+- hit_rate is the share of `same` queries served their cached phrase.
+- false_hit_rate is the share of other queries served anything at all.
+- guarded counts matches over the threshold refused by the word check.
+
+Latency: an index is filled with --entries synthetic phrases, and the
+per-lookup time is reported in microseconds for exact matches (same text
+after punctuation and case folding), near matches and misses.
+
+Usage (from the repository root):
+    python -m benchmarks.semantic_cache_bench
+    python -m benchmarks.semantic_cache_bench --entries 2048 --corpus pairs.jsonl
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+from semantic_cache import SemanticCache
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), 'data', 'semantic_pairs.jsonl')
+THRESHOLDS = (0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95)
+
+SUBJECTS = ['my head', 'my stomach', 'my back', 'my chest', 'my throat', 'my knee', 'my tooth', 'my ear', 'my eye',
+            'my left arm', 'my right leg', 'my skin', 'my foot', 'my neck', 'my shoulder', 'my wrist']
+COMPLAINTS = ['hurts', 'has hurt for {} days', 'is swollen', 'is itchy', 'feels numb', 'is bleeding',
+              'has been sore since {} days', 'burns', 'feels stiff']
+
+
+def load_pairs(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def quality(pairs, threshold):
+    cache = SemanticCache('bench', maxsize=10000, threshold=threshold, ttl=0, audit_rate=0)
+    for pair in pairs:
+        cache.set(pair['cached'], (pair['language'],), pair['cached'])
+    same = [pair for pair in pairs if pair['same']]
+    different = [pair for pair in pairs if not pair['same']]
+    hits = sum(cache.get(pair['query'], (pair['language'],)) == pair['cached'] for pair in same)
+    false_hits = [pair for pair in different if cache.get(pair['query'], (pair['language'],)) is not None]
+    return {
+        'hit_rate': round(hits / len(same), 3),
+        'false_hit_rate': round(len(false_hits) / len(different), 3),
+        'guarded': cache.guarded,
+        'false_hits': [f"{pair['cached']} -> {pair['query']}" for pair in false_hits]
+    }
+
+
+def synthetic_phrases(count):
+    phrases = []
+    for subject, complaint in itertools.product(SUBJECTS, COMPLAINTS):
+        for days in range(1, 30):
+            phrases.append(f'{subject} {complaint.format(days)}'.strip())
+    random.Random(0).shuffle(phrases)
+    while len(phrases) < count:
+        phrases += [f'{phrase} again' for phrase in phrases]
+    return phrases[:count]
+
+
+def latency(entries, lookups, threshold):
+    cache = SemanticCache('bench', maxsize=entries, threshold=threshold, ttl=0, audit_rate=0)
+    phrases = synthetic_phrases(entries)
+    for phrase in phrases:
+        cache.set(phrase, ('english',), phrase)
+    queries = {
+        'exact': [phrase.upper() + '?' for phrase in random.Random(1).sample(phrases, min(lookups, len(phrases)))],
+        'near': [f'{phrase} please' for phrase in random.Random(2).sample(phrases, min(lookups, len(phrases)))],
+        'miss': [f'do you have any {word}?' for word in ('allergies', 'insurance', 'questions', 'pain', 'family')]
+    }
+    report = {}
+    for kind, texts in queries.items():
+        times = []
+        for i in range(lookups):
+            start = time.perf_counter()
+            cache.get(texts[i % len(texts)], ('english',))
+            times.append((time.perf_counter() - start) * 1e6)
+        report[kind] = {'p50_us': round(statistics.median(times), 1),
+                        'p99_us': round(sorted(times)[int(len(times) * 0.99)], 1)}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS)
+    parser.add_argument('--entries', type=int, default=2048, help='index size for the latency test')
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--threshold', type=float, default=0.6, help='threshold for the latency test')
+    args = parser.parse_args(argv)
+
+    pairs = load_pairs(args.corpus)
+    report = {
+        'pairs': len(pairs),
+        'quality': {threshold: quality(pairs, threshold) for threshold in THRESHOLDS},
+        'latency': {size: latency(size, args.lookups, args.threshold) for size in sorted({256, args.entries})}
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
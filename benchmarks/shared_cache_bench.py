@@ -0,0 +1,83 @@
+"""
+Latency and footprint of the shared cache stores.
+
+Fills a SQLite store, and the RESP stand-in serving another SQLite store, with
+--entries translation-sized results, then reports per-operation latency in
+microseconds for sets, hits and misses. It also reports the stored bytes per
+entry against the raw JSON size. A second pass fills a store to --entries
+with a budget of half that size, to show eviction keeping it under budget.
+
+Usage (from the repository root):
+    python -m benchmarks.shared_cache_bench
+    python -m benchmarks.shared_cache_bench --entries 5000 --lookups 5000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from shared_cache import RESPServer, RESPStore, SharedCache, SQLiteStore, encode_value
+
+
+def sample_result(i):
+    return {
+        'translation': f'[{i:08x}] ڈاکٹر جلد ہی آپ کو دیکھیں گے، براہ کرم یہاں انتظار کریں۔',
+        'context': 'Polite reassurance that a doctor will come soon; the patient should wait in the room.',
+        'responses': '1. ٹھیک ہے (Okay)\n2. کتنی دیر؟ (How long?)\n3. مجھے درد ہو رہا ہے (I am in pain)'
+    }
+
+
+def timed(fn, count):
+    times = []
+    for i in range(count):
+        start = time.perf_counter()
+        fn(i)
+        times.append((time.perf_counter() - start) * 1e6)
+    return {'p50_us': round(statistics.median(times), 1), 'p99_us': round(sorted(times)[int(len(times) * 0.99)], 1)}
+
+
+def measure(cache, entries, lookups):
+    report = {'set': timed(lambda i: cache.set(('translation', 'urdu', 'hospital_to_patient', f'phrase {i}'),
+                                               sample_result(i)), entries)}
+    report['hit'] = timed(lambda i: cache.get(('translation', 'urdu', 'hospital_to_patient', f'phrase {i % entries}')),
+                          lookups)
+    report['miss'] = timed(lambda i: cache.get(('translation', 'urdu', 'hospital_to_patient', f'other {i}')), lookups)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--entries', type=int, default=2000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    raw = len(json.dumps(sample_result(0), ensure_ascii=False).encode('utf-8'))
+    report = {'entry_bytes': {'json': raw, 'stored': len(encode_value(sample_result(0)))}}
+    with tempfile.TemporaryDirectory() as directory:
+        sqlite_store = SQLiteStore(os.path.join(directory, 'bench.db'))
+        report['sqlite'] = measure(SharedCache(sqlite_store, retry_after=0), args.entries, args.lookups)
+
+        server = RESPServer(('127.0.0.1', 0), SQLiteStore(os.path.join(directory, 'resp.db')))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        resp_store = RESPStore('127.0.0.1', server.server_address[1], timeout=1.0)
+        report['resp_stand_in'] = measure(SharedCache(resp_store, retry_after=0), args.entries, args.lookups)
+        server.shutdown()
+        server.server_close()
+
+        budget = args.entries * report['entry_bytes']['stored'] // 2
+        small = SQLiteStore(os.path.join(directory, 'small.db'), max_bytes=budget)
+        cache = SharedCache(small, retry_after=0)
+        for i in range(args.entries):
+            cache.set(('translation', 'urdu', 'hospital_to_patient', f'phrase {i}'), sample_result(i))
+        report['eviction'] = {'budget_bytes': budget, **small.stats()}
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
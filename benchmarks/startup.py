@@ -0,0 +1,58 @@
+"""
+Startup-time benchmark: how long a fresh worker takes to import a module
+(app, workflow or asgi) and be ready to serve.
+
+Each run is a separate Python process, so nothing is warm. The figure is
+wall-clock time from process start to the end of the import.
+
+Usage (from the repository root):
+    python -m benchmarks.startup
+    python -m benchmarks.startup --module workflow --runs 10
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+PROBE = (
+    "import time, sys; start = time.perf_counter(); "
+    "import {module}; "
+    "sys.stderr.write('STARTUP %f\\n' % ((time.perf_counter() - start) * 1000))"
+)
+
+
+def measure(module, runs, timeout):
+    samples = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, '-c', PROBE.format(module=module)],
+                              capture_output=True, text=True, timeout=timeout)
+        lines = [line for line in proc.stderr.splitlines() if line.startswith('STARTUP ')]
+        if proc.returncode != 0 or not lines:
+            raise RuntimeError(f"importing {module} failed:\n{proc.stderr}")
+        samples.append(float(lines[-1].split()[1]))
+    samples.sort()
+    return {
+        'module': module,
+        'runs': runs,
+        'import_ms': {
+            'median': statistics.median(samples),
+            'min': samples[0],
+            'max': samples[-1]
+        }
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--module', default='app', help='module to import (app, workflow or asgi)')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=120, help='per-run timeout in seconds')
+    args = parser.parse_args(argv)
+    print(json.dumps(measure(args.module, args.runs, args.timeout), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+In-process response cache for the translation endpoints.
+
+A small LRU cache with a per-entry TTL and hit/miss counters. Entries are the
+already-parsed result dicts returned to the client, so a hit skips both the
+prompt build and the model call. SingleFlight and AsyncSingleFlight cover the
+misses: concurrent requests for the same key share one upstream call.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+def normalize_text(text):
+    # Collapse whitespace and case so "Any allergies?" and " any  allergies? " share an entry
+    return ' '.join(text.split()).casefold()
+
+
+class TTLCache:
+    def __init__(self, maxsize=512, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                # Expired entries stay until evicted or replaced, for get_stale()
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_stale(self, key):
+        """The entry for `key` even if it has expired, or None. Used as a fallback
+        when the model is unavailable; does not count as a hit or miss."""
+        with self._lock:
+            item = self._data.get(key)
+            return None if item is None else item[1]
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+class Abandoned(Exception):
+    """Settles a flight whose leader gave up without a result (e.g. its
+    streaming client disconnected). Followers in do() then make the call
+    themselves."""
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one. The first caller
+    runs fn(); callers arriving while it is in flight wait for and share its
+    result (or exception).
+
+    Callers that cannot wrap their work in one function (a streamed reply) use
+    claim() and settle() directly."""
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key):
+        """(future, leader). The leader must settle() the future; followers wait on it."""
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.calls += 1
+            else:
+                self.shared += 1
+        return future, leader
+
+    def settle(self, key, future, result=None, error=None):
+        with self._lock:
+            del self._inflight[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn):
+        future, leader = self.claim(key)
+        while not leader:
+            try:
+                return future.result()
+            except Abandoned:
+                # The leader gave up without a result; take over the call (or join whoever did)
+                future, leader = self.claim(key)
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self.settle(key, future, error=e)
+            raise
+        self.settle(key, future, result)
+        return result
+
+    def stats(self):
+        return {'calls': self.calls, 'shared': self.shared, 'inflight': len(self._inflight)}
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines. Waiters are shielded, so a client that
+    disconnects does not cancel the shared call for everyone else."""
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._inflight = {}
+
+    async def do(self, key, coro_fn):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.calls += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {'calls': self.calls, 'shared': self.shared, 'inflight': len(self._inflight)}
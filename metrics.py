@@ -0,0 +1,214 @@
+"""
+Prometheus-style metrics for Mendy, rendered by the /metrics endpoint.
+
+Counters and histograms are sharded per thread: each thread updates only its
+own dict of values, so recording a sample takes no lock and never contends
+with other request threads. A lock is taken only when a thread records its
+first sample, when a thread exits (its values are folded into a retired
+shard), and when /metrics sums the shards. No prometheus_client dependency.
+
+Gauges that already live elsewhere (cache sizes, single-flight stats) are
+read at scrape time through register_collector().
+"""
+
+import bisect
+import itertools
+import math
+import threading
+import weakref
+
+# Seconds; model calls run from tens of milliseconds up to tens of seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Shard:
+    # Held in a threading.local; when the thread exits it is collected and its values retired
+    __slots__ = ('values', '__weakref__')
+
+    def __init__(self):
+        self.values = {}
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = {}
+        self._retired = {}
+        self._ids = itertools.count()
+
+    def shard(self):
+        """This thread's values dict: {(metric name, label values): value}."""
+        try:
+            return self._local.shard.values
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            shard_id = next(self._ids)
+            with self._lock:
+                self._shards[shard_id] = shard.values
+            weakref.finalize(shard, self._retire, shard_id, shard.values)
+            return shard.values
+
+    def _retire(self, shard_id, values):
+        with self._lock:
+            self._shards.pop(shard_id, None)
+            merge_values(self._retired, values)
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collect):
+        """`collect()` returns (name, type, help, [(labels dict, value), ...]) tuples."""
+        self.collectors.append(collect)
+        return collect
+
+    def snapshot(self):
+        """Sum of every shard's values."""
+        with self._lock:
+            shards = list(self._shards.values())
+            totals = merge_values({}, self._retired)
+        for values in shards:
+            # dict.copy() and list() are single C calls, so the owning thread can keep writing
+            merge_values(totals, values.copy())
+        return totals
+
+    def render(self):
+        totals = self.snapshot()
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render(totals)
+        for collect in self.collectors:
+            for name, kind, doc, samples in collect():
+                lines += [f'# HELP {name} {doc}', f'# TYPE {name} {kind}']
+                lines += [f'{name}{format_labels(labels)} {format_value(value)}' for labels, value in samples]
+        return '\n'.join(lines) + '\n'
+
+
+def merge_values(into, values):
+    for key, value in values.items():
+        if isinstance(value, list):
+            current = into.get(key)
+            if current is None:
+                into[key] = list(value)
+            else:
+                for i, count in enumerate(list(value)):
+                    current[i] += count
+        else:
+            into[key] = into.get(key, 0) + value
+    return into
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = (f'{name}="{escape_label(value)}"' for name, value in labels.items())
+    return '{' + ','.join(pairs) + '}'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, doc, labelnames=(), registry=None):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self.registry = registry or REGISTRY
+        self.registry.register(self)
+
+    def inc(self, *labelvalues, amount=1):
+        values = self.registry.shard()
+        key = (self.name, labelvalues)
+        values[key] = values.get(key, 0) + amount
+
+    def samples(self, totals):
+        return sorted((labels, value) for (name, labels), value in totals.items() if name == self.name)
+
+    def render(self, totals):
+        lines = [f'# HELP {self.name} {self.doc}', f'# TYPE {self.name} {self.kind}']
+        for labelvalues, value in self.samples(totals):
+            lines.append(f'{self.name}{format_labels(dict(zip(self.labelnames, labelvalues)))} {format_value(value)}')
+        return lines
+
+
+class Histogram(Counter):
+    kind = 'histogram'
+
+    def __init__(self, name, doc, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        super().__init__(name, doc, labelnames, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labelvalues):
+        values = self.registry.shard()
+        key = (self.name, labelvalues)
+        # Per-bucket counts (last one is +Inf), then sum, then count
+        counts = values.get(key)
+        if counts is None:
+            counts = values[key] = [0] * (len(self.buckets) + 3)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def render(self, totals):
+        lines = [f'# HELP {self.name} {self.doc}', f'# TYPE {self.name} {self.kind}']
+        for labelvalues, counts in self.samples(totals):
+            labels = dict(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{format_labels({**labels, "le": format_value(bound)})} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {format_value(counts[-2])}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {counts[-1]}')
+        return lines
+
+
+REGISTRY = Registry()
+
+REQUESTS = Counter('mendy_requests_total', 'API requests by endpoint, language, direction and status.',
+                   ('endpoint', 'language', 'direction', 'status'))
+REQUEST_LATENCY = Histogram('mendy_request_duration_seconds',
+                            'Time from request start to response headers, including any model call.',
+                            ('endpoint', 'language', 'direction'))
+MODEL_LATENCY = Histogram('mendy_model_duration_seconds',
+                          'Time spent in upstream model calls, measured around the backend call.',
+                          ('backend', 'call'))
+MODEL_ERRORS = Counter('mendy_model_errors_total', 'Upstream model calls that raised.', ('backend', 'call'))
+MODEL_RETRIES = Counter('mendy_model_retries_total', 'Model call attempts retried after a retryable error.',
+                        ('backend', 'call'))
+PARSE_FAILURES = Counter('mendy_parse_failures_total',
+                         'Model replies the TRANSLATION/CONTEXT/RESPONSES parser could not parse.',
+                         ('format', 'language'))
+MODEL_CALLS = Counter('mendy_model_calls_total', 'Successful model calls by endpoint, language and direction.',
+                      ('backend', 'endpoint', 'language', 'direction'))
+MODEL_CALL_SECONDS = Counter('mendy_model_call_seconds_total',
+                             'Time spent in successful model calls by endpoint, language and direction.',
+                             ('backend', 'endpoint', 'language', 'direction'))
+MODEL_TOKENS = Counter('mendy_model_tokens_total',
+                       'Model tokens from usage metadata; type is input, output or cached (input served from '
+                       'a provider cache, also counted in input).',
+                       ('backend', 'endpoint', 'language', 'direction', 'type'))
+MODEL_TRUNCATIONS = Counter('mendy_model_truncated_total', 'Model replies cut off at their max_output_tokens budget.',
+                            ('backend', 'endpoint', 'language', 'direction'))
+CACHE_LOOKUPS = Counter('mendy_cache_lookups_total',
+                        'Phrasebook, translation, shared and semantic cache lookups by result.', ('cache', 'result'))
+SEMANTIC_LOOKUP_LATENCY = Histogram('mendy_semantic_cache_lookup_seconds', 'Time to search a semantic cache index.',
+                                    ('cache',), buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025))
+SEMANTIC_SIMILARITY = Histogram('mendy_semantic_cache_similarity',
+                                'Cosine similarity of semantic cache matches at or above the threshold.',
+                                ('cache', 'result'), buckets=(0.6, 0.7, 0.8, 0.9, 0.95, 0.99))
+PREFETCHES = Counter('mendy_prefetch_total',
+                     'Speculative translations of suggested patient responses; result is started, dropped '
+                     '(over budget or load), done, failed, used (later requested) or unused (evicted unrequested).',
+                     ('language', 'result'))
@@ -0,0 +1,60 @@
+"""
+Offline phrasebook of precomputed quick-question translations.
+
+The phrasebook is a JSON file generated by `flask --app app build-phrasebook`.
+It holds the parsed translation/context/responses for every quick question in
+every language and direction, so quick-button taps never need a model call.
+"""
+
+import json
+import os
+from datetime import datetime, timezone
+
+from applog import get_logger
+from cache import normalize_text
+
+log = get_logger('phrasebook')
+
+# Bump when the entry format or the translate prompts change; older files are ignored
+PHRASEBOOK_VERSION = 2
+
+
+def phrasebook_key(text, language, direction):
+    return (normalize_text(text), language, direction)
+
+
+def load_phrasebook(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        log.warning(f"Could not read phrasebook {path}: {e}")
+        return {}
+    if data.get('version') != PHRASEBOOK_VERSION:
+        log.warning(f"Ignoring phrasebook {path}: version {data.get('version')}, expected {PHRASEBOOK_VERSION}")
+        return {}
+
+    entries = {}
+    for entry in data.get('entries', []):
+        key = phrasebook_key(entry['text'], entry['language'], entry['direction'])
+        entries[key] = {
+            'translation': entry['translation'],
+            'context': entry['context'],
+            'responses': entry['responses']
+        }
+    return entries
+
+
+def write_phrasebook(path, entries, model_name):
+    data = {
+        'version': PHRASEBOOK_VERSION,
+        'model': model_name,
+        'generated_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'entries': entries
+    }
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
@@ -0,0 +1,158 @@
+"""
+Speculative prefetch of the patient's likely replies.
+
+A hospital-to-patient translation already lists, in its RESPONSES section,
+the 2-3 answers the patient is likely to give ("是的，我有保险 (Yes, I have
+insurance)"). After such a translation, Prefetcher translates the first
+`depth` of those answers in the patient-to-hospital direction on background
+threads, and caches them like any other translation. When the patient taps
+or types one, the reply is already cached.
+
+Prefetching spends model calls that may never be used, so it is off by
+default and runs under a budget:
+- a token bucket of PREFETCH_RATE calls per second (PREFETCH_BURST at once);
+- only while the model concurrency cap (MAX_INFLIGHT_MODEL_CALLS) has no
+  queue and is at most PREFETCH_MAX_LOAD full, so real requests come first;
+- at most PREFETCH_CONCURRENCY calls at a time.
+Suggestions over budget are dropped, not queued.
+
+Prefetched keys are remembered until used (or until PREFETCH_TRACKED newer
+ones push them out), so /api/cache/stats and mendy_prefetch_total can report
+the hit rate: the share of completed prefetches the patient later asked for.
+
+Environment:
+    PREFETCH_RESPONSES    1 to enable (default 0)
+    PREFETCH_DEPTH        suggested responses prefetched per translation (default 3)
+    PREFETCH_RATE         prefetch calls per second (default 1)
+    PREFETCH_BURST        prefetch calls allowed at once after a quiet spell (default 10)
+    PREFETCH_CONCURRENCY  prefetch calls in flight (default 2)
+    PREFETCH_MAX_LOAD     largest share of model call slots in use at which to prefetch (default 0.5)
+    PREFETCH_TRACKED      prefetched keys remembered for hit-rate accounting (default 4096)
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from admission import RateLimiter
+from applog import get_logger
+from metrics import PREFETCHES
+from phrasebook import phrasebook_key
+
+log = get_logger('prefetch')
+
+# "1. ", "2) ", "- ", "* ", "• " list markers
+LIST_MARKER = re.compile(r'^\s*(?:\d+[.)]|[-*•])\s*')
+# A trailing English gloss: "是的 (Yes)", "ٹھیک ہے – Okay"
+GLOSS = re.compile(r'\s*[(（][^()（）]*[)）]\s*$|\s+[-–—/]\s+[\x00-\x7f]+$')
+
+
+def suggested_responses(responses, depth=3):
+    """The first `depth` suggestions of a RESPONSES section, in the patient's
+    language, without list markers or English glosses."""
+    suggestions = []
+    for line in responses.splitlines():
+        line = LIST_MARKER.sub('', line).replace('**', '').strip()
+        if not line or line.endswith(':'):
+            continue
+        line = GLOSS.sub('', line).strip(' "“”')
+        if line and line not in suggestions:
+            suggestions.append(line)
+            if len(suggestions) >= depth:
+                break
+    return suggestions
+
+
+class Prefetcher:
+    def __init__(self, fetch, is_cached, limiter=None, enabled=None, depth=None, rate=None, burst=None,
+                 concurrency=None, max_load=None, tracked=None):
+        """`fetch(text, lang, direction, cache_key)` translates and caches one
+        phrase; `is_cached(cache_key)` says whether that is needed. `limiter` is
+        the backend's ConcurrencyLimiter."""
+        self.fetch = fetch
+        self.is_cached = is_cached
+        self.limiter = limiter
+        self.enabled = enabled if enabled is not None else os.getenv('PREFETCH_RESPONSES', '0') == '1'
+        self.depth = depth if depth is not None else int(os.getenv('PREFETCH_DEPTH', '3'))
+        self.budget = RateLimiter(rate if rate is not None else float(os.getenv('PREFETCH_RATE', '1')),
+                                  burst if burst is not None else float(os.getenv('PREFETCH_BURST', '10')))
+        self.concurrency = concurrency if concurrency is not None else int(os.getenv('PREFETCH_CONCURRENCY', '2'))
+        self.max_load = max_load if max_load is not None else float(os.getenv('PREFETCH_MAX_LOAD', '0.5'))
+        self.tracked = tracked if tracked is not None else int(os.getenv('PREFETCH_TRACKED', '4096'))
+        self.counts = {'started': 0, 'dropped': 0, 'done': 0, 'failed': 0, 'used': 0, 'unused': 0}
+        self._inflight = set()
+        # Prefetched keys not yet requested, oldest first
+        self._prefetched = OrderedDict()
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _count(self, result, lang):
+        with self._lock:
+            self.counts[result] += 1
+        PREFETCHES.inc(lang, result)
+
+    def _has_capacity(self):
+        if self.limiter is None or self.limiter.limit <= 0:
+            return True
+        stats = self.limiter.stats()
+        return not stats['waiting'] and stats['active'] < self.limiter.limit * self.max_load
+
+    def after_translation(self, cache_key, result):
+        """Prefetch the suggested replies of a fresh hospital-to-patient translation."""
+        text, lang, direction = cache_key
+        if not self.enabled or direction != 'hospital_to_patient':
+            return
+        for suggestion in suggested_responses(result.get('responses', ''), self.depth):
+            key = phrasebook_key(suggestion, lang, 'patient_to_hospital')
+            with self._lock:
+                known = key in self._inflight or key in self._prefetched
+            if known or self.is_cached(key):
+                continue
+            if not self._has_capacity() or self.budget.allow('prefetch'):
+                self._count('dropped', lang)
+                continue
+            with self._lock:
+                self._inflight.add(key)
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='prefetch')
+            self._count('started', lang)
+            self._pool.submit(self._run, suggestion, key)
+
+    def _run(self, text, key):
+        lang = key[1]
+        try:
+            self.fetch(text, lang, 'patient_to_hospital', key)
+        except Exception as e:
+            self._count('failed', lang)
+            log.info('prefetch failed', extra={'fields': {'language': lang, 'error': f'{type(e).__name__}: {e}'}})
+            return
+        finally:
+            with self._lock:
+                self._inflight.discard(key)
+        self._count('done', lang)
+        with self._lock:
+            self._prefetched[key] = True
+            evicted = []
+            while len(self._prefetched) > self.tracked:
+                evicted.append(self._prefetched.popitem(last=False)[0])
+        for old in evicted:
+            self._count('unused', old[1])
+
+    def observe(self, cache_key, cached):
+        """Note a patient-to-hospital request. A prefetched key served from the
+        cache is a hit; one that had already left the cache counts as unused."""
+        if not self.enabled:
+            return
+        with self._lock:
+            prefetched = self._prefetched.pop(cache_key, None) is not None
+        if prefetched:
+            self._count('used' if cached else 'unused', cache_key[1])
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+            pending = len(self._inflight)
+        return {'enabled': self.enabled, **counts, 'inflight': pending,
+                'hit_rate': round(counts['used'] / counts['done'], 4) if counts['done'] else 0.0}
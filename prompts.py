@@ -0,0 +1,48 @@
+"""
+Precompiled prompt templates.
+
+A prompt builder in app.py is called once per (language, direction, kind) at
+startup, with a placeholder in place of the user text. The result is split
+into a static prefix and suffix. A request then only joins three strings.
+
+Builders put the user text at the end, so the prefix is identical for every
+call of that kind. That lets providers reuse it: OpenAI caches repeated prompt
+prefixes on its own, and GeminiBackend can hold the prefix in a context cache
+(GEMINI_CONTEXT_CACHE).
+"""
+
+SLOT = '\x00user text\x00'
+
+
+class Prompt(str):
+    """A rendered prompt. It is a plain string to every backend, and also
+    carries the template's static prefix and key for provider-side caching,
+    and its endpoint/language/direction labels for usage accounting."""
+    __slots__ = ()
+    prefix = None
+    key = None
+    labels = None
+
+
+class PromptTemplate:
+    __slots__ = ('key', 'prefix', 'suffix', 'labels', 'prompt_type')
+
+    def __init__(self, key, prefix, suffix='', labels=None):
+        self.key = key
+        self.prefix = prefix
+        self.suffix = suffix
+        self.labels = labels
+        # These live on a per-template subclass, so rendering sets no instance attributes
+        self.prompt_type = type('Prompt', (Prompt,),
+                                {'__slots__': (), 'prefix': prefix, 'key': key, 'labels': labels})
+
+    @classmethod
+    def compile(cls, key, build, *args, labels=None):
+        """Build the template for `key` by calling `build(SLOT, *args)`."""
+        parts = build(SLOT, *args).split(SLOT)
+        if len(parts) != 2:
+            raise ValueError(f'prompt {key} must use the user text exactly once')
+        return cls(key, *parts, labels=labels)
+
+    def render(self, text):
+        return self.prompt_type(self.prefix + text + self.suffix)
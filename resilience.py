@@ -0,0 +1,128 @@
+"""
+Failure handling for model calls: deadlines, retries and a circuit breaker.
+
+Each attempt gets a per-call timeout, which the backend passes to the provider
+SDK. Retryable failures are retried with exponential backoff and full jitter:
+timeouts, connection errors, 429 and 5xx. The retries and their backoff sleeps
+must fit in an overall deadline.
+
+CircuitBreaker counts consecutive attempts that failed with a retryable
+error. Other errors (bad input, a blocked reply) show that the upstream is
+answering, and reset the count. After `failure_threshold` failures it
+opens, and calls fail immediately with CircuitOpenError for
+`reset_timeout` seconds instead of tying up a worker on a dead upstream. It
+then lets a single probe call through (half-open). The probe closes the
+breaker if it succeeds and reopens it if it fails.
+
+Environment:
+    MODEL_TIMEOUT_S            per-attempt timeout (default 20)
+    MODEL_DEADLINE_S           total time for all attempts and backoff (default 45)
+    MODEL_RETRIES              retries after the first attempt (default 2)
+    MODEL_BACKOFF_MS           base backoff, doubled per retry (default 250)
+    MODEL_BACKOFF_MAX_MS       backoff cap (default 4000)
+    BREAKER_FAILURE_THRESHOLD  consecutive failures that open the breaker (default 5)
+    BREAKER_RESET_S            seconds the breaker stays open (default 30)
+"""
+
+import os
+import random
+import threading
+import time
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Provider SDK exception names that are worth retrying, matched by name so the SDKs need not be imported
+RETRYABLE_NAMES = {
+    'APITimeoutError', 'APIConnectionError', 'RateLimitError', 'InternalServerError',  # openai
+    'DeadlineExceeded', 'ServiceUnavailable', 'TooManyRequests', 'ResourceExhausted',  # google.api_core
+    'GatewayTimeout', 'BadGateway'
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the model while the circuit breaker is open."""
+
+    def __init__(self, retry_after):
+        super().__init__(f'model backend unavailable, retry in {retry_after:.0f}s')
+        self.retry_after = retry_after
+
+
+def is_retryable(error):
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in RETRYABLE_NAMES:
+        return True
+    status = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+    return isinstance(status, int) and status in RETRYABLE_STATUS
+
+
+class RetryPolicy:
+    def __init__(self, timeout=None, deadline=None, retries=None, backoff=None, backoff_max=None):
+        self.timeout = timeout if timeout is not None else float(os.getenv('MODEL_TIMEOUT_S', '20'))
+        self.deadline = deadline if deadline is not None else float(os.getenv('MODEL_DEADLINE_S', '45'))
+        self.retries = retries if retries is not None else int(os.getenv('MODEL_RETRIES', '2'))
+        self.backoff = backoff if backoff is not None else float(os.getenv('MODEL_BACKOFF_MS', '250')) / 1000
+        self.backoff_max = (backoff_max if backoff_max is not None
+                            else float(os.getenv('MODEL_BACKOFF_MAX_MS', '4000')) / 1000)
+
+    def delay(self, retry):
+        """Full-jitter backoff before retry number `retry` (0-based)."""
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** retry))
+
+    def attempts(self):
+        """Yield (attempt number, timeout for that attempt, backoff before the next attempt).
+
+        Stops when the retries or the deadline run out. The caller sleeps for
+        the backoff only if the attempt failed with a retryable error."""
+        end = time.monotonic() + self.deadline
+        for attempt in range(self.retries + 1):
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return
+            delay = self.delay(attempt)
+            last = attempt == self.retries or remaining - delay <= 0
+            yield attempt, min(self.timeout, remaining), None if last else delay
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        self.failure_threshold = (failure_threshold if failure_threshold is not None
+                                  else int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5')))
+        self.reset_timeout = reset_timeout if reset_timeout is not None else float(os.getenv('BREAKER_RESET_S', '30'))
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go ahead now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            retry_after = self.opened_at + self.reset_timeout - time.monotonic()
+            if retry_after <= 0:
+                # Let one probe through; everyone else keeps failing fast until it reports back.
+                # A probe that never reports (e.g. an abandoned stream) is replaced after reset_timeout.
+                self.state = self.HALF_OPEN
+                self.opened_at = time.monotonic()
+                return
+            self.rejected += 1
+            raise CircuitOpenError(max(retry_after, 1.0))
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {'state': self.state, 'failures': self.failures, 'rejected': self.rejected}
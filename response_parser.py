@@ -0,0 +1,142 @@
+"""
+Single-pass parser for TRANSLATION/CONTEXT/RESPONSES model replies.
+
+The reply is scanned once with one compiled pattern that recognises every
+header variant the models produce: plain `TRANSLATION:`, markdown bold
+(`**TRANSLATION:**`, `**Translation**:`), markdown headings (`## Context`),
+any letter case, full-width colons, and localized header names. A name alone
+on its line is only a header when it is a heading or bold, since a bare
+"Context" or "背景" may be the translation itself. Sections must appear in
+order, as the prompt asks, and each one runs to the next accepted header.
+A missing or empty section is a ParseError, so the reply is not cached.
+
+parse_reply() parses a complete reply. IncrementalParser takes streamed
+chunks and reports each section as soon as the header after it arrives.
+Both expose the span offsets of every section.
+"""
+
+import re
+from collections import namedtuple
+
+SECTION_NAMES = ('translation', 'context', 'responses')
+
+# Header names, by section. English first, then the languages in LANGUAGE_CONFIG
+HEADER_ALIASES = {
+    'translation': ['translation', '翻译', '翻譯', '逐字翻译', 'ترجمہ', 'nkyerɛaseɛ', 'nkyerease'],
+    'context': ['context', '背景', '情境', '解释和情境', 'سیاق و سباق', 'پس منظر', 'nsɛm a ɛfa ho'],
+    'responses': ['responses', 'possible responses', '回答', '可能的回答', 'جوابات', 'ممکنہ جوابات', 'mmuaeɛ'],
+}
+
+_ALIAS_GROUP = {}
+for _name, _aliases in HEADER_ALIASES.items():
+    for _alias in _aliases:
+        _ALIAS_GROUP[_alias.casefold()] = _name
+
+# A header line: optional markdown heading/bold/italic, the name, then a colon
+# (content may follow on the same line) or, for a heading or bold name only,
+# nothing else on the line.
+HEADER_PATTERN = re.compile(
+    r'^[ \t]*(?:(?P<heading>#{1,6})[ \t]*)?(?:(?P<bold>[*_]{2,3})|[*_]?)[ \t]*'
+    r'(?P<name>' + '|'.join(sorted((re.escape(a) for a in _ALIAS_GROUP), key=len, reverse=True)) + r')'
+    r'[ \t]*[*_]{0,3}[ \t]*(?:[:：][ \t]*[*_]{0,3}[ \t]*|(?(heading)(?=\r?$)|(?(bold)(?=\r?$)|(?!))))',
+    re.IGNORECASE | re.MULTILINE
+)
+
+# header: (start, end) of the header itself; body: (start, end) of the section text, before stripping
+Section = namedtuple('Section', ['name', 'header', 'body'])
+
+
+class ParseError(ValueError):
+    pass
+
+
+def section_name(match):
+    return _ALIAS_GROUP[match.group('name').casefold()]
+
+
+def section_text(content, section):
+    return content[section.body[0]:section.body[1]].strip()
+
+
+def check_complete(content, sections):
+    if len(sections) < len(SECTION_NAMES):
+        raise ParseError(f'no {SECTION_NAMES[len(sections)].upper()} section in reply')
+    for section in sections:
+        if not section_text(content, section):
+            raise ParseError(f'empty {section.name.upper()} section in reply')
+
+
+def find_sections(content, pos=0, endpos=None):
+    """Scan `content` once and return the in-order sections that were found."""
+    sections = []
+    headers = HEADER_PATTERN.finditer(content, pos, len(content) if endpos is None else endpos)
+    for match in headers:
+        if len(sections) < len(SECTION_NAMES) and section_name(match) == SECTION_NAMES[len(sections)]:
+            if sections:
+                previous = sections[-1]
+                sections[-1] = previous._replace(body=(previous.body[0], match.start()))
+            sections.append(Section(SECTION_NAMES[len(sections)], match.span(), (match.end(), len(content))))
+    return sections
+
+
+def parse_reply(content):
+    """Parse a full reply into {translation, context, responses}. Raises ParseError
+    if a section is missing or empty."""
+    if not isinstance(content, str):
+        raise ParseError('reply is not text')
+    sections = find_sections(content)
+    check_complete(content, sections)
+    return {section.name: section_text(content, section) for section in sections}
+
+
+class IncrementalParser:
+    """Parse a reply that arrives in chunks.
+
+    feed() returns the sections completed by the new chunk as (name, text)
+    pairs; close() returns the rest and raises ParseError if the reply was
+    incomplete or has an empty section. Only whole lines are scanned, so a header split across two
+    chunks is still found, and each line is scanned once."""
+
+    def __init__(self):
+        self.content = ''
+        self.sections = []
+        self._scanned = 0
+        self._emitted = 0
+
+    def _scan(self, endpos):
+        for match in HEADER_PATTERN.finditer(self.content, self._scanned, endpos):
+            if len(self.sections) < len(SECTION_NAMES) and section_name(match) == SECTION_NAMES[len(self.sections)]:
+                if self.sections:
+                    previous = self.sections[-1]
+                    self.sections[-1] = previous._replace(body=(previous.body[0], match.start()))
+                self.sections.append(Section(SECTION_NAMES[len(self.sections)], match.span(), (match.end(), None)))
+        self._scanned = endpos
+
+    def _completed(self, final=False):
+        done = len(self.sections) if final else len(self.sections) - 1
+        completed = []
+        while self._emitted < done:
+            section = self.sections[self._emitted]
+            if section.body[1] is None:
+                section = self.sections[self._emitted] = section._replace(body=(section.body[0], len(self.content)))
+            completed.append((section.name, section_text(self.content, section)))
+            self._emitted += 1
+        return completed
+
+    def feed(self, chunk):
+        self.content += chunk
+        newline = chunk.rfind('\n')
+        if newline == -1:
+            return []
+        self._scan(len(self.content) - len(chunk) + newline + 1)
+        return self._completed()
+
+    def close(self):
+        if self._scanned < len(self.content):
+            self._scan(len(self.content))
+        completed = self._completed(final=True)
+        check_complete(self.content, self.sections)
+        return completed
+
+    def result(self):
+        return {section.name: section_text(self.content, section) for section in self.sections}
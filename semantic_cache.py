@@ -0,0 +1,243 @@
+"""
+Near-duplicate cache for the translate and advice endpoints.
+
+The exact cache only matches after whitespace and case folding. "I have
+fever" and "i have a fever", or "我发烧了" and "我发烧", still miss it. This
+second tier embeds each input as a character n-gram vector: the 2- and
+3-grams of the text with punctuation removed, L2-normalized. That works the
+same for English, Chinese, Urdu and Twi without a model or tokenizer. Each
+(language, direction) scope has its own inverted index from n-gram to entry
+weights. A lookup scores only the entries that could still reach
+`threshold`, and picks the most similar one.
+
+A near-duplicate is not always the same request. "I have hypertension" and
+"I have hypotension" are close as strings, and so are "I have a fever" and
+"I have no fever". A match at or above the threshold is therefore only
+served if the words that differ are filler ("a", "the", "了", ...). Chinese
+is compared character by character, with "一个" (a) as one word. Any other
+difference refuses the match: a negation, left/right, a number, and also a
+one-letter change, since "fell"/"feel" or "nine"/"mine" are as often two
+words as a typo. Refused matches are counted as 'guarded'.
+
+Hits, misses, guarded matches, lookup time and hit similarity are recorded
+in metrics. A fraction of hits (`audit_rate`) is logged with both texts, for
+reviewing false hits. benchmarks/semantic_cache_bench.py measures hit and
+false-hit rates on labelled pairs.
+
+Environment:
+    SEMANTIC_CACHE_SIZE        entries per (language, direction) (default 2048; 0 disables)
+    SEMANTIC_CACHE_THRESHOLD   minimum cosine similarity for a match (default 0.6)
+    SEMANTIC_CACHE_AUDIT_RATE  fraction of hits logged for review (default 0.05)
+"""
+
+import itertools
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from applog import get_logger
+from cache import normalize_text
+from metrics import CACHE_LOOKUPS, SEMANTIC_LOOKUP_LATENCY, SEMANTIC_SIMILARITY
+
+log = get_logger('semantic_cache')
+
+PUNCTUATION = re.compile(r'[^\w\s]')
+
+# Words that may differ between two texts for the same request
+FILLER = {'a', 'an', 'the', 'this', 'that', 'any', 'some', 'please', 'um', 'uh', 'so', 'well', 'really',
+          '了', '的', '吗', '呢', '啊', '吧', '呀', '一个', '个', '请'}
+# A Chinese character, or "一个" (a) kept whole so that 一 (one) on its own is a number
+CJK_WORDS = re.compile(r'一个|.', re.DOTALL)
+
+
+def simplify(text):
+    # "Don't" -> "dont" before the rest of the punctuation goes
+    return PUNCTUATION.sub(' ', normalize_text(text).replace("'", '').replace('’', '')).strip()
+
+
+def vectorize(simple):
+    """L2-normalized {n-gram: weight} for the 2- and 3-grams of `simple`."""
+    padded = f' {" ".join(simple.split())} '
+    counts = Counter(padded[i:i + n] for n in (2, 3) for i in range(len(padded) - n + 1))
+    norm = math.sqrt(sum(count * count for count in counts.values())) or 1.0
+    return {gram: count / norm for gram, count in counts.items()}
+
+
+def is_cjk(char):
+    return '\u3400' <= char <= '\u9fff' or '\uf900' <= char <= '\ufaff'
+
+
+def tokens(simple):
+    """Words of `simple`, with Chinese split into characters."""
+    result = Counter()
+    for word in simple.split():
+        if any(is_cjk(char) for char in word):
+            result.update(CJK_WORDS.findall(word))
+        else:
+            result[word] += 1
+    return result
+
+
+def same_request(a, b):
+    """Whether token counts `a` and `b` differ only in filler words."""
+    return all(word in FILLER for word in (a - b) + (b - a))
+
+
+class _Entry:
+    __slots__ = ('text', 'vector', 'tokens', 'result', 'expires')
+
+    def __init__(self, text, vector, tokens, result, expires):
+        self.text = text
+        self.vector = vector
+        self.tokens = tokens
+        self.result = result
+        self.expires = expires
+
+
+class _Index:
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.by_text = {}
+        self.postings = {}
+
+    def add(self, entry_id, entry):
+        self.entries[entry_id] = entry
+        self.by_text[entry.text] = entry_id
+        for gram, weight in entry.vector.items():
+            self.postings.setdefault(gram, {})[entry_id] = weight
+
+    def remove(self, entry_id):
+        entry = self.entries.pop(entry_id)
+        if self.by_text.get(entry.text) == entry_id:
+            del self.by_text[entry.text]
+        for gram in entry.vector:
+            posting = self.postings[gram]
+            del posting[entry_id]
+            if not posting:
+                del self.postings[gram]
+
+    def nearest(self, vector, threshold):
+        """(entry id, cosine similarity) of the closest entry with a similarity
+        of at least `threshold`, or (None, 0.0)."""
+        # Rarest n-grams first. Once the query weight left is under the threshold, an entry
+        # sharing none of the n-grams seen so far cannot reach it (Cauchy-Schwarz), so the
+        # remaining n-grams only add to the scores of entries already found.
+        scores = {}
+        remaining = 1.0
+        for gram in sorted(vector, key=lambda gram: len(self.postings.get(gram, ()))):
+            posting = self.postings.get(gram)
+            weight = vector[gram]
+            if not posting:
+                remaining -= weight * weight
+            elif remaining >= threshold * threshold:
+                remaining -= weight * weight
+                for entry_id, entry_weight in posting.items():
+                    scores[entry_id] = scores.get(entry_id, 0.0) + weight * entry_weight
+            elif len(posting) < len(scores):
+                for entry_id, entry_weight in posting.items():
+                    if entry_id in scores:
+                        scores[entry_id] += weight * entry_weight
+            else:
+                for entry_id in scores:
+                    scores[entry_id] += weight * posting.get(entry_id, 0.0)
+        best = max(scores, key=scores.get, default=None)
+        if best is None or scores[best] < threshold:
+            return None, 0.0
+        return best, scores[best]
+
+
+class SemanticCache:
+    def __init__(self, name, maxsize=None, threshold=None, ttl=3600, audit_rate=None):
+        self.name = name
+        self.maxsize = maxsize if maxsize is not None else int(os.getenv('SEMANTIC_CACHE_SIZE', '2048'))
+        self.threshold = threshold if threshold is not None else float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.6'))
+        self.ttl = ttl
+        self.audit_rate = (audit_rate if audit_rate is not None
+                           else float(os.getenv('SEMANTIC_CACHE_AUDIT_RATE', '0.05')))
+        self.hits = 0
+        self.misses = 0
+        self.guarded = 0
+        self._indexes = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(index.entries) for index in self._indexes.values())
+
+    def get(self, text, scope):
+        """The stored result for the nearest text in `scope` (e.g. (language,
+        direction)), or None if nothing is similar enough."""
+        if self.maxsize <= 0:
+            return None
+        start = time.perf_counter()
+        simple = simplify(text)
+        vector = vectorize(simple)
+        with self._lock:
+            index = self._indexes.get(scope)
+            if index is None:
+                entry_id, similarity = None, 0.0
+            elif simple in index.by_text:
+                # Same text once punctuation is gone; no need to search
+                entry_id, similarity = index.by_text[simple], 1.0
+            else:
+                entry_id, similarity = index.nearest(vector, self.threshold)
+            entry = index.entries[entry_id] if entry_id is not None else None
+            if entry is not None and entry.expires is not None and entry.expires < time.monotonic():
+                index.remove(entry_id)
+                entry = None
+            if entry is None:
+                outcome = 'miss'
+                self.misses += 1
+            elif not same_request(entry.tokens, tokens(simple)):
+                outcome = 'guarded'
+                self.guarded += 1
+            else:
+                outcome = 'hit'
+                self.hits += 1
+                index.entries.move_to_end(entry_id)
+        SEMANTIC_LOOKUP_LATENCY.observe(time.perf_counter() - start, self.name)
+        CACHE_LOOKUPS.inc(self.name, outcome)
+        if outcome == 'miss':
+            return None
+        SEMANTIC_SIMILARITY.observe(similarity, self.name, outcome)
+        if outcome == 'guarded':
+            log.info('semantic cache match guarded', extra={'fields': {
+                'cache': self.name, 'scope': '/'.join(map(str, scope)), 'text': text, 'matched': entry.text,
+                'similarity': round(similarity, 3)}})
+            return None
+        if random.random() < self.audit_rate:
+            log.info('semantic cache audit', extra={'fields': {
+                'cache': self.name, 'scope': '/'.join(map(str, scope)), 'text': text, 'matched': entry.text,
+                'similarity': round(similarity, 3)}})
+        return entry.result
+
+    def set(self, text, scope, result, ttl=None):
+        """Store `result` for `text`. ttl=0 keeps the entry until it is evicted."""
+        if self.maxsize <= 0:
+            return
+        simple = simplify(text)
+        ttl = self.ttl if ttl is None else ttl
+        entry = _Entry(simple, vectorize(simple), tokens(simple), result,
+                       time.monotonic() + ttl if ttl else None)
+        with self._lock:
+            index = self._indexes.setdefault(scope, _Index())
+            if simple in index.by_text:
+                index.remove(index.by_text[simple])
+            index.add(next(self._ids), entry)
+            while len(index.entries) > self.maxsize:
+                # Least recently served first
+                index.remove(next(iter(index.entries)))
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.guarded
+        return {
+            'size': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'guarded': self.guarded,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
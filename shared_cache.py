@@ -0,0 +1,444 @@
+"""
+Shared, persistent cache tier for translation and advice results.
+
+The in-process caches (cache.py, semantic_cache.py) start empty on every
+restart, and each gunicorn worker holds its own copy. This tier sits behind
+them and is shared by every worker, and it survives restarts, so a fresh
+worker serves warm hits from its first request.
+
+SHARED_CACHE_URL picks the store:
+- sqlite:///path/to/cache.db: one SQLite file on the local host (WAL mode,
+  reads through mmap). Entries have a TTL. When the file's entries pass
+  SHARED_CACHE_MAX_MB, the least recently read ones are evicted.
+- redis://[:password@]host:port/db: anything that speaks the Redis protocol
+  (RESP). Entries are set with a TTL, and size-based eviction is up to the
+  server (maxmemory-policy). `flask --app app cache-server` runs a small local
+  stand-in that serves RESP from a SQLite store.
+
+Values are compact JSON, zlib-compressed when that makes them smaller. A
+store that fails (Redis down, locked file) is skipped for
+SHARED_CACHE_RETRY_S seconds; requests just see misses meanwhile.
+
+Environment:
+    SHARED_CACHE_URL      store URL (default empty: no shared tier)
+    SHARED_CACHE_MAX_MB   size budget of a SQLite store (default 64)
+    SHARED_CACHE_TIMEOUT_S  socket timeout for Redis stores (default 0.05)
+    SHARED_CACHE_RETRY_S  seconds to skip a failed store (default 5)
+"""
+
+import json
+import os
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import unquote, urlsplit
+
+from applog import get_logger
+from metrics import CACHE_LOOKUPS
+
+log = get_logger('shared_cache')
+
+# Values at least this long are stored compressed if that saves space
+COMPRESS_MIN_BYTES = 256
+# A hit only rewrites an entry's last-read time if it is older than this, to keep reads read-only
+ACCESS_RESOLUTION_S = 60
+
+
+class RESPError(Exception):
+    """An error reply from a RESP server."""
+
+
+def encode_value(value):
+    data = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if len(data) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(data, 6)
+        if len(packed) < len(data):
+            return b'z' + packed
+    return b'j' + data
+
+
+def decode_value(blob):
+    kind, data = blob[:1], blob[1:]
+    if kind == b'z':
+        data = zlib.decompress(data)
+    elif kind != b'j':
+        raise ValueError(f'unknown cache value format {kind!r}')
+    return json.loads(data)
+
+
+class SQLiteStore:
+    """Byte values in one SQLite file, shared by the processes on a host."""
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._written = 0
+        self._lock = threading.Lock()
+        # Once per store: WAL mode is kept in the file, and the schema only needs creating once
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._local.conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+                         'size INTEGER NOT NULL, expires REAL, accessed REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=1.0)
+        # Per-connection settings; neither touches the file
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA mmap_size={self.max_bytes * 2}')
+        return conn
+
+    def _connection(self):
+        # One connection per thread; sqlite3 connections are not shared across threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def get(self, key):
+        conn = self._connection()
+        row = conn.execute('SELECT value, expires, accessed FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires, accessed = row
+        now = time.time()
+        if expires is not None and expires < now:
+            return None
+        if now - accessed > ACCESS_RESOLUTION_S:
+            with conn:
+                conn.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+        return value
+
+    def set(self, key, value, ttl=None):
+        """Store `value` (bytes) for `ttl` seconds; no ttl keeps it until it is evicted."""
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                         (key, value, len(value), now + ttl if ttl else None, now))
+        with self._lock:
+            self._written += len(value)
+            # Check the size about 32 times per budget's worth of writes, not on every write
+            due = self._written >= self.max_bytes // 32
+            if due:
+                self._written = 0
+        if due:
+            self.evict()
+
+    def delete(self, key):
+        conn = self._connection()
+        with conn:
+            return conn.execute('DELETE FROM entries WHERE key = ?', (key,)).rowcount
+
+    def evict(self):
+        """Drop expired entries, then the least recently read ones until the
+        store is back under 90% of its budget."""
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM entries WHERE expires < ?', (time.time(),))
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            excess = total - int(self.max_bytes * 0.9)
+            victims = []
+            for key, size in conn.execute('SELECT key, size FROM entries ORDER BY accessed'):
+                victims.append((key,))
+                excess -= size
+                if excess <= 0:
+                    break
+            conn.executemany('DELETE FROM entries WHERE key = ?', victims)
+        log.info('shared cache evicted', extra={'fields': {'path': self.path, 'entries': len(victims)}})
+
+    def clear(self):
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM entries')
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def stats(self):
+        count, size = self._connection().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        return {'store': 'sqlite', 'entries': count, 'bytes': size, 'max_bytes': self.max_bytes}
+
+
+def encode_command(*args):
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode('utf-8')
+        elif isinstance(arg, int):
+            arg = str(arg).encode()
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+def read_reply(f):
+    line = f.readline()
+    if not line.endswith(b'\r\n'):
+        raise ConnectionError('connection closed by the cache server')
+    kind, rest = line[:1], line[1:-2]
+    if kind == b'+':
+        return rest.decode()
+    if kind == b'-':
+        raise RESPError(rest.decode())
+    if kind == b':':
+        return int(rest)
+    if kind == b'$':
+        length = int(rest)
+        return None if length < 0 else f.read(length + 2)[:-2]
+    if kind == b'*':
+        length = int(rest)
+        return None if length < 0 else [read_reply(f) for _ in range(length)]
+    raise ConnectionError(f'unexpected reply from the cache server: {line[:40]!r}')
+
+
+class RESPStore:
+    """Byte values on a Redis-protocol server, through a small connection pool."""
+
+    def __init__(self, host='127.0.0.1', port=6379, db=0, password=None, timeout=0.05, pool_size=8):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._pool = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = (sock, sock.makefile('rb'))
+        try:
+            if self.password:
+                self._send(conn, 'AUTH', self.password)
+            if self.db:
+                self._send(conn, 'SELECT', self.db)
+        except BaseException:
+            sock.close()
+            raise
+        return conn
+
+    @staticmethod
+    def _send(conn, *args):
+        sock, reader = conn
+        sock.sendall(encode_command(*args))
+        return read_reply(reader)
+
+    def command(self, *args):
+        with self._lock:
+            conn = self._pool.pop() if self._pool else None
+        if conn is None:
+            conn = self._connect()
+        try:
+            reply = self._send(conn, *args)
+        except RESPError:
+            self._release(conn)
+            raise
+        except BaseException:
+            # The connection may be half-way through a reply; never reuse it
+            conn[0].close()
+            raise
+        self._release(conn)
+        return reply
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._pool) < self.pool_size:
+                self._pool.append(conn)
+                return
+        conn[0].close()
+
+    def get(self, key):
+        return self.command('GET', key)
+
+    def set(self, key, value, ttl=None):
+        if ttl:
+            self.command('SET', key, value, 'PX', int(ttl * 1000))
+        else:
+            self.command('SET', key, value)
+
+    def delete(self, key):
+        return self.command('DEL', key)
+
+    def clear(self):
+        self.command('FLUSHDB')
+
+    def __len__(self):
+        return self.command('DBSIZE')
+
+    def stats(self):
+        return {'store': 'resp', 'address': f'{self.host}:{self.port}/{self.db}', 'entries': len(self)}
+
+
+def open_store(url, max_bytes=None, timeout=None):
+    """The store for a SHARED_CACHE_URL, or None for an empty URL."""
+    if not url:
+        return None
+    parts = urlsplit(url)
+    if parts.scheme == 'sqlite':
+        max_bytes = max_bytes or int(float(os.getenv('SHARED_CACHE_MAX_MB', '64')) * 1024 * 1024)
+        # sqlite:///abs/path.db and sqlite://relative/path.db
+        return SQLiteStore(unquote(parts.netloc + parts.path), max_bytes)
+    if parts.scheme == 'redis':
+        timeout = timeout or float(os.getenv('SHARED_CACHE_TIMEOUT_S', '0.05'))
+        return RESPStore(parts.hostname or '127.0.0.1', parts.port or 6379, int(parts.path.strip('/') or 0),
+                         unquote(parts.password) if parts.password else None, timeout)
+    raise ValueError(f'SHARED_CACHE_URL must start with sqlite:// or redis://, got {url!r}')
+
+
+class SharedCache:
+    """JSON values over a store, under `namespace`. Store errors count as
+    misses, and the store is skipped for `retry_after` seconds after one."""
+
+    def __init__(self, store, ttl=86400, namespace='mendy', retry_after=None):
+        self.store = store
+        self.ttl = ttl
+        self.namespace = namespace
+        self.retry_after = (retry_after if retry_after is not None
+                            else float(os.getenv('SHARED_CACHE_RETRY_S', '5')))
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._down_until = 0.0
+
+    def _key(self, key):
+        return ':'.join((self.namespace, *key))
+
+    def _available(self):
+        return self.store is not None and time.monotonic() >= self._down_until
+
+    def _failed(self, action, e):
+        self.errors += 1
+        self._down_until = time.monotonic() + self.retry_after
+        log.warning('shared cache unavailable', extra={'fields': {
+            'action': action, 'error': f'{type(e).__name__}: {e}', 'retry_after_s': self.retry_after}})
+
+    def get(self, key):
+        """The value stored under the `key` tuple, or None."""
+        if self.store is None:
+            return None
+        outcome, value = 'miss', None
+        if not self._available():
+            outcome = 'error'
+        else:
+            try:
+                blob = self.store.get(self._key(key))
+                if blob is not None:
+                    outcome, value = 'hit', decode_value(blob)
+            except (OSError, sqlite3.Error, RESPError) as e:
+                self._failed('get', e)
+                outcome = 'error'
+            except ValueError as e:
+                log.warning('shared cache entry unreadable', extra={'fields': {
+                    'key': self._key(key), 'error': f'{type(e).__name__}: {e}'}})
+        if outcome == 'hit':
+            self.hits += 1
+        elif outcome == 'miss':
+            self.misses += 1
+        CACHE_LOOKUPS.inc('shared', outcome)
+        return value
+
+    def set(self, key, value, ttl=None):
+        if not self._available():
+            return
+        try:
+            self.store.set(self._key(key), encode_value(value), self.ttl if ttl is None else ttl)
+        except (OSError, sqlite3.Error, RESPError) as e:
+            self._failed('set', e)
+
+    def stats(self):
+        if self.store is None:
+            return {'enabled': False}
+        lookups = self.hits + self.misses
+        stats = {'enabled': True, 'hits': self.hits, 'misses': self.misses, 'errors': self.errors,
+                 'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0}
+        if self._available():
+            try:
+                stats.update(self.store.stats())
+            except (OSError, sqlite3.Error, RESPError) as e:
+                self._failed('stats', e)
+        return stats
+
+
+class _RESPHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                args = read_reply(self.rfile)
+            except (ConnectionError, RESPError, ValueError):
+                return
+            if not isinstance(args, list) or not args:
+                self.wfile.write(b'-ERR expected an array of bulk strings\r\n')
+                continue
+            try:
+                reply = self.server.execute([arg if isinstance(arg, bytes) else str(arg).encode() for arg in args])
+            except RESPError as e:
+                reply = e
+            self.wfile.write(encode_reply(reply))
+            if args[0].upper() == b'QUIT':
+                return
+
+
+def encode_reply(value):
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, RESPError):
+        return f'-ERR {value}\r\n'.encode()
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, str):
+        return f'+{value}\r\n'.encode()
+    if isinstance(value, list):
+        return b'*%d\r\n' % len(value) + b''.join(encode_reply(item) for item in value)
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+class RESPServer(socketserver.ThreadingTCPServer):
+    """A local stand-in for Redis: the GET/SET/DEL subset this cache uses,
+    served from a SQLiteStore, so it persists and evicts by size."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, store):
+        super().__init__(address, _RESPHandler)
+        self.store = store
+
+    def execute(self, args):
+        name = args[0].upper().decode('ascii', 'replace')
+        if name == 'PING':
+            return 'PONG' if len(args) == 1 else args[1]
+        if name in ('QUIT', 'SELECT', 'AUTH', 'CLIENT'):
+            return 'OK'
+        if name == 'COMMAND':
+            return []
+        if name == 'GET' and len(args) == 2:
+            return self.store.get(args[1].decode())
+        if name == 'SET' and len(args) in (3, 5):
+            ttl = None
+            if len(args) == 5:
+                unit = args[3].upper()
+                if unit not in (b'EX', b'PX'):
+                    raise RESPError(f'unsupported SET option {args[3].decode()}')
+                ttl = int(args[4]) / (1 if unit == b'EX' else 1000)
+            self.store.set(args[1].decode(), args[2], ttl)
+            return 'OK'
+        if name == 'DEL' and len(args) >= 2:
+            return sum(self.store.delete(key.decode()) for key in args[1:])
+        if name == 'EXISTS' and len(args) >= 2:
+            return sum(self.store.get(key.decode()) is not None for key in args[1:])
+        if name == 'DBSIZE':
+            return len(self.store)
+        if name in ('FLUSHDB', 'FLUSHALL'):
+            self.store.clear()
+            return 'OK'
+        raise RESPError(f"unknown command or wrong number of arguments for '{name.lower()}'")
@@ -0,0 +1,81 @@
+"""
+Structured (JSON) output mode for translate replies.
+
+With TRANSLATE_OUTPUT_MODE=json the backend is asked for a JSON object that
+matches TRANSLATION_SCHEMA instead of TRANSLATION/CONTEXT/RESPONSES text.
+Replies are checked with a small hand-written validator (no jsonschema
+dependency). Replies that fail are repaired locally where possible: code
+fences and surrounding prose are stripped, lists are joined, and as a last
+resort the text section parser is tried.
+"""
+
+import json
+
+TRANSLATION_FIELDS = ('translation', 'context', 'responses')
+
+# JSON schema in the subset both Gemini (response_schema) and OpenAI (strict json_schema) accept
+TRANSLATION_SCHEMA = {
+    'type': 'object',
+    'properties': {field: {'type': 'string'} for field in TRANSLATION_FIELDS},
+    'required': list(TRANSLATION_FIELDS),
+    'additionalProperties': False
+}
+
+
+def validate_translation(data):
+    """Return True if `data` is a dict with a non-empty string for every field."""
+    return (isinstance(data, dict)
+            and all(isinstance(data.get(field), str) and data[field].strip() for field in TRANSLATION_FIELDS))
+
+
+def extract_json_object(content):
+    """Decode the first JSON object in `content`, ignoring code fences or prose around it."""
+    start = content.find('{')
+    while start != -1:
+        try:
+            data, _ = json.JSONDecoder().raw_decode(content, start)
+            if isinstance(data, dict):
+                return data
+        except ValueError:
+            pass
+        start = content.find('{', start + 1)
+    return None
+
+
+def coerce_field(value):
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, list):
+        return '\n'.join(coerce_field(item) for item in value if item is not None)
+    if isinstance(value, dict):
+        return '\n'.join(f"{key}: {coerce_field(item)}" for key, item in value.items())
+    if value is None:
+        return ''
+    return str(value)
+
+
+def parse_structured_translation(content, fallback_parser=None):
+    """Parse a JSON-mode reply into {translation, context, responses}.
+
+    Returns (result, repaired). Raises ValueError if the reply cannot be
+    turned into a valid result."""
+    try:
+        data = json.loads(content)
+        if validate_translation(data):
+            return {field: data[field].strip() for field in TRANSLATION_FIELDS}, False
+    except ValueError:
+        data = extract_json_object(content)
+
+    if isinstance(data, dict):
+        # Field names in any case, values that came back as lists or objects
+        fields = {str(key).strip().lower(): value for key, value in data.items()}
+        repaired = {field: coerce_field(fields.get(field)) for field in TRANSLATION_FIELDS}
+        if validate_translation(repaired):
+            return repaired, True
+
+    if fallback_parser is not None:
+        try:
+            return fallback_parser(content), True
+        except ValueError:
+            pass
+    raise ValueError('reply is not a valid translation object')
@@ -0,0 +1,74 @@
+"""
+Precompiled Jinja templates.
+
+`flask --app app build-templates` compiles every template in the app's
+template folder to a Python module under TEMPLATE_CACHE_DIR. A template is
+only recompiled and rewritten when its source hash has changed. At startup
+the compiled modules are used if every source still matches the manifest.
+Otherwise the app falls back to compiling from source as usual.
+"""
+
+import hashlib
+import json
+import os
+
+from jinja2 import ChoiceLoader, ModuleLoader
+
+from applog import get_logger
+
+log = get_logger('templates')
+
+MANIFEST = 'manifest.json'
+
+
+def source_hashes(app):
+    hashes = {}
+    for name in app.jinja_loader.list_templates():
+        source, _, _ = app.jinja_loader.get_source(app.jinja_env, name)
+        hashes[name] = hashlib.sha256(source.encode('utf-8')).hexdigest()
+    return hashes
+
+
+def read_manifest(target):
+    try:
+        with open(os.path.join(target, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def build_templates(app, target):
+    """Compile changed templates into `target`. Returns the names that were written."""
+    os.makedirs(target, exist_ok=True)
+    manifest = read_manifest(target)
+    hashes = source_hashes(app)
+    changed = [name for name, digest in hashes.items()
+               if manifest.get(name) != digest
+               or not os.path.exists(os.path.join(target, ModuleLoader.get_module_filename(name)))]
+    if changed:
+        # A fresh environment, since the app's own may already be loading from `target`
+        env = app.create_jinja_environment()
+        env.compile_templates(target, filter_func=lambda name: name in changed,
+                              zip=None, ignore_errors=False)
+    for name in set(manifest) - set(hashes):
+        path = os.path.join(target, ModuleLoader.get_module_filename(name))
+        if os.path.exists(path):
+            os.remove(path)
+    if changed or set(manifest) != set(hashes):
+        tmp_path = os.path.join(target, MANIFEST + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(hashes, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, os.path.join(target, MANIFEST))
+    return changed
+
+
+def use_compiled_templates(app, target):
+    """Serve templates from `target` if it is up to date. Returns True if installed."""
+    manifest = read_manifest(target)
+    if not manifest:
+        return False
+    if manifest != source_hashes(app):
+        log.warning(f"Compiled templates in {target} are stale; run `flask --app app build-templates`")
+        return False
+    app.jinja_env.loader = ChoiceLoader([ModuleLoader(target), app.jinja_env.loader])
+    return True
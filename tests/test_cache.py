@@ -0,0 +1,64 @@
+import threading
+import time
+
+from cache import Abandoned, SingleFlight
+
+
+def test_concurrent_calls_share_one_result():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return 'result'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do('key', fn))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while flights.calls + flights.shared < 5:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ['result'] * 5
+    assert len(calls) == 1
+    assert flights.stats() == {'calls': 1, 'shared': 4, 'inflight': 0}
+
+
+def test_follower_takes_over_when_leader_abandons():
+    flights = SingleFlight()
+    future, leader = flights.claim('key')
+    assert leader
+
+    results = []
+    follower = threading.Thread(target=lambda: results.append(flights.do('key', lambda: 'own result')))
+    follower.start()
+    while flights.shared < 1:
+        time.sleep(0.001)
+    flights.settle('key', future, error=Abandoned('the streaming client disconnected'))
+    follower.join(5)
+    assert results == ['own result']
+    assert flights.stats() == {'calls': 2, 'shared': 1, 'inflight': 0}
+
+
+def test_leader_errors_reach_followers():
+    flights = SingleFlight()
+    future, _ = flights.claim('key')
+    errors = []
+
+    def follow():
+        try:
+            flights.do('key', lambda: 'unused')
+        except TimeoutError as e:
+            errors.append(e)
+
+    follower = threading.Thread(target=follow)
+    follower.start()
+    while flights.shared < 1:
+        time.sleep(0.001)
+    flights.settle('key', future, error=TimeoutError('model timed out'))
+    follower.join(5)
+    assert [str(e) for e in errors] == ['model timed out']
@@ -0,0 +1,184 @@
+"""
+Per-request phase timing for the API endpoints.
+
+Each API request gets a Trace, held in a context variable. Code on the request
+path wraps its phases in `with phase('name'):`. A phase is recorded as a child
+span of the request, or skipped cheaply when no trace is active. For example,
+/api/translate records decode, cache, prompt, model, parse and jsonify phases.
+
+Every traced response gets a Server-Timing header with the phase durations, so
+browser dev tools and load tests can see where the time went. If TRACE_FILE is
+set, finished traces are also written there as OTLP/JSON lines, one
+`resourceSpans` document per request. That is the format read by the
+OpenTelemetry Collector's otlpjsonfile receiver. Lines are written by a
+background thread, as in applog.
+
+An incoming W3C `traceparent` header is honoured, so spans join the caller's trace.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import time
+from contextlib import contextmanager
+
+TRACE_FILE = os.getenv('TRACE_FILE')
+SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'mendy')
+
+TRACEPARENT = re.compile(r'^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+class Span:
+    __slots__ = ('name', 'span_id', 'parent_id', 'start', 'end', 'attributes', 'error')
+
+    def __init__(self, name, parent_id, attributes=None):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.end = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    @property
+    def duration_ms(self):
+        return ((self.end or time.perf_counter()) - self.start) * 1e3
+
+
+class Trace:
+    def __init__(self, name, traceparent=None, attributes=None):
+        match = TRACEPARENT.match(traceparent or '')
+        self.trace_id = match.group(1) if match else os.urandom(16).hex()
+        # Anchor perf_counter readings to wall-clock time for the exported timestamps
+        self.unix_ns = time.time_ns()
+        self.root = Span(name, match.group(2) if match else None, attributes)
+        self.spans = []
+
+    def start_span(self, name, attributes=None):
+        span = Span(name, self.root.span_id, attributes)
+        self.spans.append(span)
+        return span
+
+    def finish(self, **attributes):
+        self.root.attributes.update(attributes)
+        self.root.end = time.perf_counter()
+
+    def server_timing(self):
+        """Server-Timing header value: each finished phase, then the total so far."""
+        metrics = [f'{span.name};dur={span.duration_ms:.2f}' for span in self.spans if span.end is not None]
+        metrics.append(f'total;dur={self.root.duration_ms:.2f}')
+        return ', '.join(metrics)
+
+    def unix_nanos(self, perf):
+        return str(self.unix_ns + int((perf - self.root.start) * 1e9))
+
+    def to_otlp(self):
+        spans = []
+        for span in [self.root] + self.spans:
+            entry = {
+                'traceId': self.trace_id,
+                'spanId': span.span_id,
+                'name': span.name,
+                # SPAN_KIND_SERVER for the request, SPAN_KIND_INTERNAL for phases
+                'kind': 2 if span is self.root else 1,
+                'startTimeUnixNano': self.unix_nanos(span.start),
+                'endTimeUnixNano': self.unix_nanos(span.end or self.root.end or time.perf_counter()),
+                'attributes': [otlp_attribute(key, value) for key, value in span.attributes.items()],
+                'status': {'code': 2, 'message': span.error} if span.error else {}
+            }
+            if span.parent_id:
+                entry['parentSpanId'] = span.parent_id
+            spans.append(entry)
+        return {'resourceSpans': [{
+            'resource': {'attributes': [otlp_attribute('service.name', SERVICE_NAME)]},
+            'scopeSpans': [{'scope': {'name': 'mendy.tracing'}, 'spans': spans}]
+        }]}
+
+
+def otlp_attribute(key, value):
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+@contextmanager
+def phase(name, **attributes):
+    """Time the enclosed block as a phase of the current request, if one is traced."""
+    trace = current_trace.get()
+    if trace is None:
+        yield None
+        return
+    span = trace.start_span(name, attributes)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        span.end = time.perf_counter()
+
+
+def start_trace(name, traceparent=None, **attributes):
+    trace = Trace(name, traceparent, attributes)
+    current_trace.set(trace)
+    return trace
+
+
+def end_trace(trace, **attributes):
+    """Finish `trace`, export it if TRACE_FILE is set and clear the current trace."""
+    if trace.root.end is None:
+        trace.finish(**attributes)
+    if exporter is not None:
+        exporter.export(trace)
+    current_trace.set(None)
+
+
+def traced_stream(chunks, trace):
+    """Iterate a streamed response body with `trace` current, ending it with the stream."""
+    current_trace.set(trace)
+    try:
+        yield from chunks
+    finally:
+        end_trace(trace)
+
+
+class SpanFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.trace.to_otlp(), ensure_ascii=False)
+
+
+class FileSpanExporter:
+    """Appends traces to `path` as OTLP/JSON lines from a background thread."""
+
+    def __init__(self, path):
+        handler = logging.FileHandler(path, encoding='utf-8')
+        handler.setFormatter(SpanFormatter())
+        self.queue = queue.SimpleQueue()
+        self.listener = logging.handlers.QueueListener(self.queue, handler)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def export(self, trace):
+        record = logging.makeLogRecord({'name': 'mendy.tracing', 'msg': trace.root.name})
+        record.trace = trace
+        self.queue.put(record)
+
+    def close(self):
+        """Flush queued traces and stop the writer thread."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+
+exporter = FileSpanExporter(TRACE_FILE) if TRACE_FILE else None
@@ -0,0 +1,161 @@
+"""
+Model token usage and cost accounting.
+
+Provider backends call report_usage() with the token counts from each reply's
+usage metadata. MeteredBackend picks them up when the call returns. It passes
+them to LEDGER.record() together with the call time and the prompt's labels
+(endpoint, language, direction; see prompts.py). The labels travel on the
+prompt, so batch calls made from a thread pool are still attributed to
+their language. Output tokens include a thinking model's reasoning tokens,
+which are billed as output. A stream the client stops reading is recorded
+with the usage reported so far.
+
+Totals are exported in two places:
+- /metrics, as mendy_model_tokens_total, mendy_model_calls_total,
+  mendy_model_call_seconds_total and mendy_model_truncated_total. The last one
+  counts replies cut off at their max_output_tokens budget.
+- A daily rollup. Every USAGE_FLUSH_S seconds, the totals gathered since the
+  last flush are appended as JSON lines to USAGE_DIR/usage-YYYY-MM-DD.jsonl
+  (UTC date). Appending lets several worker processes share a file.
+  `flask --app app usage-report` sums a day's file and prices it with
+  MODEL_PRICES.
+
+Environment:
+    USAGE_DIR      directory for the daily rollup files (default usage; empty disables them)
+    USAGE_FLUSH_S  seconds between rollup writes (default 60)
+    MODEL_PRICES   USD per million input/output tokens by model,
+                   e.g. "gpt-4o-mini=0.15/0.60,gemini-flash-latest=0.30/2.50"
+"""
+
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+
+from applog import get_logger
+from metrics import MODEL_CALL_SECONDS, MODEL_CALLS, MODEL_TOKENS, MODEL_TRUNCATIONS
+
+USAGE_DIR = os.getenv('USAGE_DIR', 'usage')
+USAGE_FLUSH_S = float(os.getenv('USAGE_FLUSH_S', '60'))
+
+UNLABELLED = {'endpoint': 'other', 'language': 'other', 'direction': ''}
+
+log = get_logger('usage')
+
+# (input tokens, output tokens, cached input tokens, truncated) of the current model call, set by the backend
+call_usage = contextvars.ContextVar('call_usage', default=None)
+
+
+def report_usage(input_tokens, output_tokens, cached_tokens=0, truncated=False):
+    call_usage.set((input_tokens or 0, output_tokens or 0, cached_tokens or 0, truncated))
+
+
+def parse_prices(spec):
+    """{model: (input USD, output USD) per million tokens} from a MODEL_PRICES string."""
+    prices = {}
+    for entry in filter(None, (part.strip() for part in (spec or '').split(','))):
+        model, _, price = entry.partition('=')
+        input_price, _, output_price = price.partition('/')
+        prices[model.strip()] = (float(input_price), float(output_price or input_price))
+    return prices
+
+
+def rollup_path(directory, day):
+    return os.path.join(directory, f'usage-{day}.jsonl')
+
+
+class UsageLedger:
+    def __init__(self, directory=USAGE_DIR, flush_interval=USAGE_FLUSH_S):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        # (model, backend, endpoint, language, direction) -> [calls, input, output, cached, seconds, truncated]
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._writer = None
+
+    def record(self, backend, model, prompt, seconds, usage):
+        labels = getattr(prompt, 'labels', None) or UNLABELLED
+        endpoint, language, direction = labels['endpoint'], labels['language'], labels['direction']
+        input_tokens, output_tokens, cached_tokens, truncated = usage or (0, 0, 0, False)
+        MODEL_CALLS.inc(backend, endpoint, language, direction)
+        MODEL_CALL_SECONDS.inc(backend, endpoint, language, direction, amount=seconds)
+        if usage:
+            MODEL_TOKENS.inc(backend, endpoint, language, direction, 'input', amount=input_tokens)
+            MODEL_TOKENS.inc(backend, endpoint, language, direction, 'output', amount=output_tokens)
+            if cached_tokens:
+                MODEL_TOKENS.inc(backend, endpoint, language, direction, 'cached', amount=cached_tokens)
+        if truncated:
+            MODEL_TRUNCATIONS.inc(backend, endpoint, language, direction)
+            log.info('model reply truncated', extra={'fields': {
+                'endpoint': endpoint, 'language': language, 'output_tokens': output_tokens}})
+        if not self.directory:
+            return
+        with self._lock:
+            totals = self._pending.setdefault((model, backend, endpoint, language, direction), [0, 0, 0, 0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += input_tokens
+            totals[2] += output_tokens
+            totals[3] += cached_tokens
+            totals[4] += seconds
+            totals[5] += truncated
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name='usage-rollup', daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Append the totals gathered since the last flush to today's rollup file."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        now = time.time()
+        stamp = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(now))
+        lines = []
+        for (model, backend, endpoint, language, direction), totals in pending.items():
+            lines.append(json.dumps({
+                'ts': stamp, 'pid': os.getpid(), 'model': model, 'backend': backend, 'endpoint': endpoint,
+                'language': language, 'direction': direction, 'calls': totals[0], 'input_tokens': totals[1],
+                'output_tokens': totals[2], 'cached_tokens': totals[3], 'model_seconds': round(totals[4], 3),
+                'truncated': totals[5]
+            }, ensure_ascii=False))
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # One write per flush, so lines from concurrent workers do not interleave
+            with open(rollup_path(self.directory, time.strftime('%Y-%m-%d', time.gmtime(now))), 'a',
+                      encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        except OSError:
+            log.exception('usage rollup write failed', extra={'fields': {'directory': self.directory}})
+
+
+def summarize(path, prices=None):
+    """Sum a rollup file by (model, endpoint, language, direction). Cost is None
+    for models without a price."""
+    summary = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            key = (entry['model'], entry['endpoint'], entry['language'], entry['direction'])
+            totals = summary.setdefault(key, {
+                'calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'cached_tokens': 0, 'model_seconds': 0.0,
+                'truncated': 0})
+            for field in totals:
+                totals[field] += entry.get(field, 0)
+    for (model, *_), totals in summary.items():
+        price = (prices or {}).get(model)
+        totals['cost_usd'] = (None if price is None else
+                              (totals['input_tokens'] * price[0] + totals['output_tokens'] * price[1]) / 1e6)
+    return summary
+
+
+LEDGER = UsageLedger()
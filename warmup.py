@@ -0,0 +1,114 @@
+"""
+Cache warm-up from recorded request logs.
+
+After a deploy every cache starts cold, so the first hour of traffic waits on
+the model. `flask --app app warm-cache LOGFILE...` replays the translate
+requests recorded in the JSON logs (the 'translate' lines with language,
+direction and text) before traffic arrives:
+
+1. Count the requests per cache key and rank the keys by frequency.
+2. Skip keys that the phrasebook or a cache already answers.
+3. Translate the remaining keys, most frequent first, from a thread pool
+   through the normal backend (retries, circuit breaker, concurrency cap).
+   Stop at the call budget or the time budget.
+
+The results are written to every cache tier, so the warm-up only outlives
+its own process with a shared cache (SHARED_CACHE_URL). The report says what
+share of the recorded traffic the warmed caches would have answered.
+"""
+
+import gzip
+import json
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from applog import get_logger
+from phrasebook import phrasebook_key
+
+log = get_logger('warmup')
+
+
+def read_logs(paths):
+    """The lines of each log file in turn; .gz files are decompressed."""
+    for path in paths:
+        with (gzip.open if path.endswith('.gz') else open)(path, 'rt', encoding='utf-8') as f:
+            yield from f
+
+
+def read_requests(lines):
+    """Counter of translate requests by cache key, and the first text seen for
+    each key, from JSON log lines. Other lines are skipped."""
+    counts = Counter()
+    texts = {}
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if not isinstance(entry, dict) or entry.get('msg') != 'translate':
+            continue
+        text, lang, direction = entry.get('text'), entry.get('language'), entry.get('direction')
+        if not (isinstance(text, str) and text and isinstance(lang, str) and isinstance(direction, str)):
+            continue
+        key = phrasebook_key(text, lang, direction)
+        counts[key] += 1
+        texts.setdefault(key, text)
+    return counts, texts
+
+
+def warm(counts, texts, is_cached, fetch, concurrency=4, max_calls=500, max_seconds=600, min_count=1,
+         dry_run=False):
+    """Fetch the most requested uncached keys. `is_cached(key)` says whether a
+    cache already answers a key; `fetch(text, lang, direction, key)` translates
+    and caches one. With dry_run, only report what warming would cover."""
+    total = sum(counts.values())
+    report = {'requests': total, 'distinct': len(counts), 'already_cached': 0, 'planned': 0, 'warmed': 0,
+              'failed': 0, 'skipped': 0}
+    covered = 0
+    pending = []
+    for key, count in counts.most_common():
+        if is_cached(key):
+            report['already_cached'] += 1
+            covered += count
+        elif count < min_count or len(pending) >= max_calls:
+            report['skipped'] += 1
+        else:
+            pending.append((key, count))
+    report['planned'] = len(pending)
+    report['coverage_before'] = round(covered / total, 4) if total else 0.0
+    if dry_run:
+        covered += sum(count for _, count in pending)
+        pending = []
+
+    deadline = time.monotonic() + max_seconds
+    planned = iter(pending)
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        running = {}
+
+        def submit():
+            # Keep `concurrency` calls in flight; nothing new starts after the deadline
+            for key, count in planned:
+                if time.monotonic() >= deadline:
+                    report['skipped'] += 1
+                    continue
+                running[pool.submit(fetch, texts[key], key[1], key[2], key)] = (key, count)
+                return
+
+        for _ in range(max(1, concurrency)):
+            submit()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                key, count = running.pop(future)
+                try:
+                    future.result()
+                    report['warmed'] += 1
+                    covered += count
+                except Exception as e:
+                    report['failed'] += 1
+                    log.warning('warm-up translation failed', extra={'fields': {
+                        'language': key[1], 'direction': key[2], 'error': f'{type(e).__name__}: {e}'}})
+                submit()
+    report['coverage'] = round(covered / total, 4) if total else 0.0
+    return report